@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+
+from __future__ import division
+import sys
+from copy import deepcopy
+import numpy as np
+
+sys.dont_write_bytecode = True
+
+"""
+Bit-packed individual. Feature i (start at 0) is stored in bit (7 - i%8) of byte i//8, the bytes being kept in uint64
+words. Compared with the '0'/'1' string individuals, it takes one bit per feature.
+"""
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _pack(bits):
+    """bits -> uint64 words. bits is a 0/1 uint8 array"""
+    packed = np.packbits(bits)
+    padded = np.zeros(-(-len(packed) // 8) * 8, dtype=np.uint8)
+    padded[:len(packed)] = packed
+    return padded.view(np.uint64)
+
+
+class BitIndividual(object):
+    __slots__ = ('words', 'n', 'fitness')
+
+    def __init__(self, bits=''):
+        """
+        :param bits: '0'/'1' string (the str individual form), another BitIndividual, or a sequence of 0/1
+        """
+        if isinstance(bits, BitIndividual):
+            self.n, self.words = bits.n, bits.words.copy()
+            return
+        if isinstance(bits, str):
+            bits = bits.encode('ascii') if not isinstance(bits, bytes) else bits
+            bits = np.frombuffer(bits, dtype=np.uint8) - ord('0')
+        else:
+            bits = np.asarray(bits, dtype=np.uint8)
+        self.n = len(bits)
+        self.words = _pack(bits)
+
+    def to_array(self):
+        """:return: 0/1 uint8 array of length n"""
+        return np.unpackbits(self.words.view(np.uint8))[:self.n]
+
+    def __str__(self):
+        s = (self.to_array() + ord('0')).tobytes()
+        return s if isinstance(s, str) else s.decode('ascii')
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("BitIndividual index out of range")
+        return '1' if (self.words.view(np.uint8)[i >> 3] >> (7 - (i & 7))) & 1 else '0'
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def flip(self, i):
+        self.words.view(np.uint8)[i >> 3] ^= 1 << (7 - (i & 7))
+
+    def count(self):
+        """popcount. number of selected features"""
+        return int(_POPCOUNT[self.words.view(np.uint8)].sum(dtype=np.int64))
+
+    def hamming(self, other):
+        return int(_POPCOUNT[(self.words ^ other.words).view(np.uint8)].sum(dtype=np.int64))
+
+    def __eq__(self, other):
+        return isinstance(other, BitIndividual) and self.n == other.n and bool((self.words == other.words).all())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s('%s')" % (self.__class__.__name__, str(self))
+
+    def __getstate__(self):
+        return self.n, self.words.tobytes(), getattr(self, 'fitness', None)
+
+    def __setstate__(self, state):
+        self.n, words, fitness = state
+        self.words = np.frombuffer(words, dtype=np.uint64).copy()
+        if fitness is not None:
+            self.fitness = fitness
+
+    def __deepcopy__(self, memo):
+        res = self.__class__.__new__(self.__class__)
+        res.n, res.words = self.n, self.words.copy()
+        if hasattr(self, 'fitness'):
+            res.fitness = deepcopy(self.fitness, memo)
+        return res
@@ -24,8 +24,11 @@ from __future__ import division
 
 import sys
 from os import path
+import numpy as np
 from deap import base, creator, tools
-from ProductLine.dimacs_parser import load_product_url
+from ProductLine.dimacs_parser import load_product_arrays, arrays_to_cnfs, load_augment, load_fixed_features
+from ProductLine.BitIndividual import BitIndividual
+from ProductLine.model_registry import create_once
 
 
 sys.dont_write_btyecode = True
@@ -36,34 +39,254 @@ PROJECT_PATH, _ = [i for i in sys.path if i.endswith('SPL')][0], \
 sign = lambda x: '1' if x>0 else '0'
 
 
-class DimacsModel:
-    def __init__(self, fm_name):
+class DimacsModel(object):
+    def __init__(self, fm_name, reducedDec=False, use_cache=True):
+        """
+        Prefer ProductLine.model_registry.get_model, which loads each model once per process.
+        :param reducedDec: if True, simplify the model at load time (see simplify). Individuals are still full
+         configurations, but search can run over the reduced decisions through decode/encode.
+        :param use_cache: load the cnfs from the compiled cache (see dimacs_parser.load_product_arrays)
+        """
+        self.name = fm_name
+        self.reducedDec = reducedDec
         fm = "{0}/dimacs_data/{1}.dimacs".format(PROJECT_PATH, fm_name)
-        _, self.featureNum, self.cnfs, self.cnfNum = load_product_url(fm)
+        _, self.featureNum, lits, offsets, self.cnfNum = load_product_arrays(fm, use_cache)
+        self.cnf_lens = np.diff(offsets).astype(np.int32)
+        self.cnf_lits = np.array(lits, dtype=np.int32)
+        self.build_occurrences()
 
-        self.cost = []
-        self.used_before = []
-        self.defects = []
+        self.cores, self.deads = [], []
+        if reducedDec:
+            self.simplify(*load_fixed_features(fm))
+        self.free_features = np.setdiff1d(np.arange(self.featureNum), self.cores + self.deads)
+        self.decNum = len(self.free_features)
+        self._template = np.zeros(self.featureNum, dtype=np.uint8) + ord('0')
+        self._template[self.cores] = ord('1')
 
-        with open(fm+".augment", "r") as f:
-            lines = f.readlines()
-            lines = filter(lambda x: not x.startswith('#'), lines)  # ignore the comments
-            lines = map(lambda x:x.rstrip(), lines)
-            for l in lines:
-                _, a, b, c = l.split(" ")
-                self.cost.append(float(a))
-                self.used_before.append(bool(int(b)))
-                self.defects.append(int(c))
+        self.cnfs = arrays_to_cnfs(self.cnf_lits, np.concatenate([[0], np.cumsum(self.cnf_lens)]))
 
-        creator.create("FitnessMin", base.Fitness, weights=[-1.0] * 5)
-        creator.create("Individual", str, fitness=creator.FitnessMin)
+        self.cost, self.used_before, self.defects = load_augment(fm, self.featureNum)
+        # the vectors feature_objectives takes dot products with
+        self.used_defects = np.where(self.used_before, self.defects, 0).astype(np.int64)
+        self.unused_before = (~self.used_before).astype(np.int64)
+
+        create_once("FitnessMin", base.Fitness, weights=[-1.0] * 5)
+        create_once("Individual", str, fitness=creator.FitnessMin)
+        create_once("BitIndividual", BitIndividual, fitness=creator.FitnessMin, __slots__=())
 
         self.creator = creator
         self.Individual = creator.Individual
+        self.BitIndividual = creator.BitIndividual
+
+        self.pack_cnfs()
 
         self.toolbox = base.Toolbox()
         self.toolbox.register("evaluate", self.eval_ind)
+        self.toolbox.register("evaluate_population", self.eval_population)
+        self.toolbox.register("repair", self.repair)
         self.eval = self.toolbox.evaluate
+        self.pool_map = None
+        self.repairer = None
+
+    def parallelize(self, processes=None, chunksize=None):
+        """
+        Register a process pool based map into the toolbox. See ProductLine.parallel_eval.PoolMap
+        """
+        from ProductLine.parallel_eval import PoolMap
+        self.close_pool()
+        self.pool_map = PoolMap(self, processes, chunksize)
+        self.toolbox.register("map", self.pool_map)
+        return self.pool_map
+
+    def close_pool(self):
+        if self.pool_map is not None:
+            self.pool_map.close()
+            self.pool_map = None
+            self.toolbox.register("map", map)
+
+    def repair(self, ind, violated=None):
+        """
+        Nearby valid configuration of ind. See ProductLine.repair.WalkSATRepair
+        :param violated: indices of the cnfs violated by ind, if known
+        :return: valid individual (fitness not evaluated), number of features changed
+        """
+        if self.repairer is None:
+            from ProductLine.repair import WalkSATRepair
+            self.repairer = WalkSATRepair(self)
+        return self.repairer.repair(ind, violated)
+
+    def simplify(self, cores=(), deads=()):
+        """
+        Fixes the core (always selected) and dead (never selected) features by full unit propagation, starting from
+        the unit cnfs plus the given cores and deads (index start at 0). Satisfied cnfs are dropped and false literals
+        are stripped from the rest, so the cnfs (and cnfNum) only keep the constraints among the free features, plus
+        one unit cnf per core and dead feature. A configuration is valid iff it violates none of the simplified cnfs;
+        with the cores selected and the deads unselected it violates as many simplified cnfs as original ones.
+        Results are saved in self.cores and self.deads (sorted lists, index start at 0).
+        """
+        lits = self.cnf_lits.tolist()
+        offsets = np.concatenate([[0], np.cumsum(self.cnf_lens)]).tolist()
+        occ_ptr, occ_cnfs, occ_signs = self.occ_ptr.tolist(), self.occ_cnfs.tolist(), self.occ_signs.tolist()
+
+        value = [-1] * self.featureNum
+        sat = [False] * self.cnfNum
+        free = self.cnf_lens.tolist()
+        queue = [lits[offsets[i]] for i in range(self.cnfNum) if free[i] == 1]
+        queue += [i+1 for i in cores] + [-i-1 for i in deads]
+
+        while queue:
+            x = queue.pop()
+            v, val = abs(x) - 1, int(x > 0)
+            if value[v] == val:
+                continue
+            if value[v] != -1:
+                raise ValueError("%s: feature %d is both core and dead" % (self.name, v))
+            value[v] = val
+            for o in range(occ_ptr[v], occ_ptr[v+1]):
+                c = occ_cnfs[o]
+                if sat[c]:
+                    continue
+                if occ_signs[o] == val:
+                    sat[c] = True
+                    continue
+                free[c] -= 1
+                if free[c] == 0:
+                    raise ValueError("%s: cnf %d can never be satisfied" % (self.name, c))
+                if free[c] == 1:
+                    queue.extend(y for y in lits[offsets[c]:offsets[c+1]] if value[abs(y)-1] == -1)
+
+        new_lits, new_lens = [], []
+        for c in range(self.cnfNum):
+            if sat[c]:
+                continue
+            kept = [y for y in lits[offsets[c]:offsets[c+1]] if value[abs(y)-1] == -1]
+            new_lits.extend(kept)
+            new_lens.append(len(kept))
+
+        self.cores = [i for i, val in enumerate(value) if val == 1]
+        self.deads = [i for i, val in enumerate(value) if val == 0]
+        # keep the fixed features checked: a full configuration with a wrong core/dead is not valid
+        new_lits.extend([i+1 for i in self.cores] + [-i-1 for i in self.deads])
+        new_lens.extend([1] * (len(self.cores) + len(self.deads)))
+        self.cnf_lits = np.array(new_lits, dtype=np.int32)
+        self.cnf_lens = np.array(new_lens, dtype=np.int32)
+        self.cnfNum = len(new_lens)
+        self.build_occurrences()
+
+    def decode(self, dec):
+        """
+        reduced decisions -> full individual. cores are set to '1', deads to '0', the free features are read from dec
+        """
+        res = self._template.copy()
+        res[self.free_features] = np.frombuffer(str(dec).encode('ascii'), dtype=np.uint8)
+        res = res.tobytes()
+        return self.Individual(res if isinstance(res, str) else res.decode('ascii'))
+
+    def encode(self, ind):
+        """
+        full individual -> reduced decisions (the free features only)
+        """
+        res = np.frombuffer(str(ind).encode('ascii'), dtype=np.uint8)[self.free_features].tobytes()
+        return res if isinstance(res, str) else res.decode('ascii')
+
+    def pack_cnfs(self):
+        """
+        Store the cnfs as a (cnfNum x width) matrix of feature indices (start at 0) and a matching matrix of the
+        literal signs. Rows are sorted by clause length (longest first), so that column w only needs checking in the
+        first cnf_width_counts[w] rows.
+        """
+        lens, flat = self.cnf_lens, self.cnf_lits
+        width = int(lens.max()) if len(lens) else 0  # no cnf left, e.g. all satisfied by the simplification
+        lits = np.zeros((len(lens), width), dtype=np.int32)
+        lits[np.arange(width) < lens[:, None]] = flat
+
+        self.cnf_order = np.argsort(-lens, kind='mergesort')
+        lits = lits[self.cnf_order]
+        self.cnf_vars = np.abs(lits) - 1
+        self.cnf_signs = (lits > 0).astype(np.uint8)
+        self.cnf_width_counts = (lens[:, None] > np.arange(width)).sum(axis=0)
+
+    def build_occurrences(self):
+        """
+        Index from features to the cnfs they appear in, stored as CSR arrays. The occurrences of feature i (start at 0)
+        are occ_cnfs[occ_ptr[i]:occ_ptr[i+1]], with literal signs in occ_signs.
+        """
+        occ_vars = np.abs(self.cnf_lits) - 1
+        order = np.argsort(occ_vars, kind='mergesort')
+
+        self.occ_vars = occ_vars[order]
+        self.occ_cnfs = np.repeat(np.arange(self.cnfNum, dtype=np.int32), self.cnf_lens)[order]
+        self.occ_signs = (self.cnf_lits[order] > 0).astype(np.uint8)
+        self.occ_ptr = np.zeros(self.featureNum + 1, dtype=np.int64)
+        self.occ_ptr[1:] = np.cumsum(np.bincount(self.occ_vars, minlength=self.featureNum))
+
+    def pop_matrix(self, inds):
+        """
+        :param inds: str individuals or BitIndividuals
+        :return: (len(inds) x featureNum) 0/1 uint8 matrix
+        """
+        if all(isinstance(ind, BitIndividual) for ind in inds):
+            packed = np.vstack([ind.words.view(np.uint8) for ind in inds])
+            return np.unpackbits(packed, axis=1)[:, :self.featureNum]
+
+        buf = ''.join(map(str, inds))
+        if not isinstance(buf, bytes):
+            buf = buf.encode('ascii')
+        return (np.frombuffer(buf, dtype=np.uint8) - ord('0')).reshape(len(inds), self.featureNum)
+
+    def sat_counts(self, ind):
+        """
+        :param ind: str individual, BitIndividual, or 0/1 array of the features
+        :return: the number of satisfied literals in each cnf (in the order of self.cnfs). 0 means violated.
+        """
+        bits = ind if isinstance(ind, np.ndarray) else self.pop_matrix([ind])[0]
+        hits = bits[self.occ_vars] == self.occ_signs
+        return np.bincount(self.occ_cnfs[hits], minlength=self.cnfNum).astype(np.int32)
+
+    @staticmethod
+    def violated_cnfs(counts):
+        return np.flatnonzero(counts == 0)
+
+    def eval_flips(self, ind, parent, counts, flipped, copy=False):
+        """
+        Evaluate ind, which differs from the evaluated parent only at the flipped features (index start at 0).
+        Only the cnfs where the flipped features appear are checked. Listed features where ind equals parent (e.g.
+        flipped twice) are skipped.
+        Objectives are the same as eval_ind, except that cost is updated by deltas, so it can be off by float rounding.
+        :param counts: sat_counts of the parent. UPDATED IN PLACE into the counts of ind, unless copy
+        :param copy: if True, work on a copy of counts (keeps the parent's counts, but costs O(cnfNum))
+        :return: sat_counts of ind
+        """
+        convio, unselected, unused, defect, cost = parent.fitness.values
+        new_counts = counts.copy() if copy else counts
+
+        flipped = [i for i in sorted(set(flipped)) if ind[i] != parent[i]]
+        if not flipped:
+            ind.fitness.values = (convio, unselected, unused, defect, cost)
+            return new_counts
+
+        starts, ends = self.occ_ptr[flipped], self.occ_ptr[np.add(flipped, 1)]
+        idx = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+        bits = np.array([ind[i] == '1' for i in flipped], dtype=np.uint8)
+        new_bits = np.repeat(bits, ends - starts)
+        cnfs = self.occ_cnfs[idx]
+        delta = np.where(new_bits == self.occ_signs[idx], 1, -1).astype(np.int32)
+
+        touched = np.unique(cnfs)
+        before = new_counts[touched] == 0
+        np.add.at(new_counts, cnfs, delta)
+        after = new_counts[touched] == 0
+        convio += int(after.sum()) - int(before.sum())
+
+        d = bits.astype(np.int64) * 2 - 1  # +1 for selected, -1 for unselected
+        used_before = self.used_before[flipped]
+        unselected -= int(d.sum())
+        cost += float(np.dot(d, self.cost[flipped]))
+        defect += int(np.dot(d[used_before], self.defects[flipped][used_before]))
+        unused += int(d[~used_before].sum())
+
+        ind.fitness.values = (convio, unselected, unused, defect, cost)
+        return new_counts
 
     def eval_ind(self, ind):
         convio = 0
@@ -76,17 +299,58 @@ class DimacsModel:
             if not corr:
                 convio += 1
 
-        unselected, unused, defect, cost = 0, 0, 0, 0
-        for i, selected in enumerate(map(int, ind)):
-            if not selected:
-                unselected += 1
-            else:
-                cost += self.cost[i]
-                if self.used_before[i]:
-                    defect += self.defects[i]
-                else:
-                    unused += 1
+        unselected, unused, defect, cost = [a[0] for a in self.feature_objectives(self.pop_matrix([ind]))]
         ind.fitness.values = (convio, unselected, unused, defect, cost)
+        return ind.fitness.values
+
+    def eval_population(self, inds, chunk_size=1 << 24):
+        """
+        Evaluate all individuals at once. Results (and the fitness values been set) are identical to eval_ind.
+        :param inds: list of individuals, i.e. '0'/'1' strings of length featureNum, or BitIndividuals
+        :param chunk_size: max number of (individual, clause) pairs being checked at the same time
+        :return: list of fitness values tuples, in the order of inds
+        """
+        if len(inds) == 0:
+            return []
+
+        res = self.objectives(self.pop_matrix(inds), chunk_size)
+        for ind, fit in zip(inds, res):
+            ind.fitness.values = fit
+        return res
+
+    def objectives(self, pop, chunk_size=1 << 24):
+        """
+        :param pop: (n x featureNum) 0/1 matrix, see pop_matrix
+        :return: list of (convio, unselected, unused, defect, cost) tuples
+        """
+        convio = np.empty(pop.shape[0], dtype=np.int64)
+        step = max(1, chunk_size // max(1, self.cnfNum))  # no cnf: convio is 0 for all
+        for start in range(0, pop.shape[0], step):
+            sub = pop[start:start+step]
+            sat = np.zeros((sub.shape[0], self.cnfNum), dtype=bool)
+            for w, k in enumerate(self.cnf_width_counts):
+                sat[:, :k] |= sub[:, self.cnf_vars[:k, w]] == self.cnf_signs[:k, w]
+            convio[start:start+step] = self.cnfNum - sat.sum(axis=1)
+
+        unselected, unused, defect, cost = self.feature_objectives(pop, chunk_size)
+        return list(zip(convio.tolist(), unselected, unused, defect, cost))
+
+    def feature_objectives(self, pop, chunk_size=1 << 24):
+        """
+        The objectives not related to the cnfs, as popcounts, dot products and masked sums over the feature arrays.
+        :param pop: (n x featureNum) 0/1 matrix, see pop_matrix
+        :return: lists of unselected, unused, defect and cost
+        """
+        unselected = self.featureNum - pop.sum(axis=1, dtype=np.int64)
+        unused = np.dot(pop, self.unused_before)
+        defect = np.dot(pop, self.used_defects)
+        # row by row (pairwise) sums. a row gets the same cost whether it is evaluated alone or in a population
+        cost = np.empty(pop.shape[0], dtype=np.float64)
+        step = max(1, chunk_size // (8 * self.featureNum))
+        for start in range(0, pop.shape[0], step):
+            cost[start:start+step] = np.where(pop[start:start+step], self.cost, 0.0).sum(axis=1)
+
+        return unselected.tolist(), unused.tolist(), defect.tolist(), cost.tolist()
 
     # @staticmethod
     # def bit_flip_mutate(individual):
@@ -23,57 +23,322 @@
 
 
 from __future__ import division
+import gzip
+import hashlib
+import os
 import re
+import struct
 import sys
+import numpy as np
 from universe import PROJECT_PATH
 
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
 sys.dont_write_bytecode = True
 
+"""
+Compiled cnf cache, stored next to the dimacs file as <url>.cache
+  header: magic, featureNum, cnfNum, literal number, size of the names block,
+          source file size, source file mtime, source file sha1
+  int64 clause offsets (cnfNum+1) | int32 literals | '\n' joined feature names
+"""
+CACHE_MAGIC = b'SPLCNF01'
+CACHE_HEADER = struct.Struct('<8s5qd20s4x')
+
+
+def _sha1(url):
+    h = hashlib.sha1()
+    with open(url, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.digest()
+
+
+def _write_atomic(path, chunks):
+    """
+    Write the chunks (bytes) into a temporary file renamed to path at the end, so that concurrent readers (e.g. pool
+    workers) see the old file or the complete new one, never a partial one.
+    Errors are ignored (e.g. read-only data folder), the callers just go without the cache.
+    """
+    tmp = '%s.%d' % (path, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_cache(url, src, feature_names, featureNum, lits, offsets, cnfNum):
+    st = os.stat(src)
+    names = '\n'.join(feature_names).encode('utf-8')
+    header = CACHE_HEADER.pack(CACHE_MAGIC, featureNum, cnfNum, len(lits), len(names), st.st_size, st.st_mtime,
+                               _sha1(src))
+    _write_atomic(url + '.cache', [header,
+                                   np.asarray(offsets, dtype='<i8').tobytes(),
+                                   np.asarray(lits, dtype='<i4').tobytes(),
+                                   names])
+
+
+def _read_cache(url, src):
+    """
+    :return: None if the cache is missing or out of date. otherwise the same as load_product_arrays.
+    """
+    cache = url + '.cache'
+    try:
+        with open(cache, 'rb') as f:
+            header = f.read(CACHE_HEADER.size)
+    except (IOError, OSError):
+        return None
+    if len(header) != CACHE_HEADER.size or not header.startswith(CACHE_MAGIC):
+        return None
+    _, featureNum, cnfNum, litNum, namesLen, size, mtime, sha1 = CACHE_HEADER.unpack(header)
+
+    st = os.stat(src)
+    if (st.st_size, st.st_mtime) != (size, mtime):
+        # touched, but may not be modified. compare the content before dropping the cache
+        if st.st_size != size or _sha1(src) != sha1:
+            return None
+        try:
+            with open(cache, 'r+b') as f:
+                f.write(CACHE_HEADER.pack(CACHE_MAGIC, featureNum, cnfNum, litNum, namesLen, st.st_size,
+                                          st.st_mtime, sha1))
+        except (IOError, OSError):
+            pass
+
+    pos = CACHE_HEADER.size
+    offsets = np.memmap(cache, dtype='<i8', mode='r', offset=pos, shape=(cnfNum+1,))
+    pos += 8 * (cnfNum+1)
+    lits = np.memmap(cache, dtype='<i4', mode='r', offset=pos, shape=(litNum,)) if litNum else np.zeros(0, np.int32)
+    pos += 4 * litNum
+    with open(cache, 'rb') as f:
+        f.seek(pos)
+        names = f.read(namesLen).decode('utf-8')
+    feature_names = [str(n) for n in names.split('\n')] if featureNum else []
+    return feature_names, featureNum, lits, offsets, cnfNum
+
+
+def arrays_to_cnfs(lits, offsets):
+    """flat literal array + clause offsets -> list of int lists"""
+    lits = np.asarray(lits).tolist()
+    offsets = np.asarray(offsets).tolist()
+    return [lits[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def load_product_arrays(url, use_cache=True):
+    """
+    Same as load_product_url, but cnfs are given as a flat int32 literal array and int64 clause offsets (cnf i is
+    lits[offsets[i]:offsets[i+1]]). With use_cache, they are memory-mapped from the compiled cache, which is
+    (re)built whenever missing or out of date.
+    url can also be given without its .gz/.xz extension.
+    :return: feature_names, featureNum, lits, offsets, cnfNum
+    """
+    src = _find_source(url)
+    url = re.sub(r'\.(gz|xz)$', '', url)
+    if use_cache:
+        res = _read_cache(url, src)
+        if res is not None:
+            return res
+
+    res = parse_dimacs_stream(src)
+    if use_cache:
+        _write_cache(url, src, *res)
+    return res
+
+
+def load_product_url(url, use_cache=True):
+    feature_names, featureNum, lits, offsets, cnfNum = load_product_arrays(url, use_cache)
+    return feature_names, featureNum, arrays_to_cnfs(lits, offsets), cnfNum
 
-def load_product_url(url):
-    feature_names = []
-    featureNum = 0
-    cnfNum = 0
-    cnfs = []
 
+def _find_source(url):
+    if os.path.exists(url):
+        return url
+    for ext in ['.gz', '.xz']:
+        if os.path.exists(url + ext):
+            return url + ext
+    raise IOError("No such dimacs file: " + url)
+
+
+def open_dimacs(url):
+    """open the dimacs file for reading lines. .gz and .xz files are decompressed on the fly."""
+    if url.endswith('.gz'):
+        return gzip.open(url, 'rt') if sys.version_info[0] > 2 else gzip.open(url, 'r')
+    if url.endswith('.xz'):
+        assert lzma is not None, "lzma (or backports.lzma) is required to read " + url
+        return lzma.open(url, 'rt') if sys.version_info[0] > 2 else lzma.open(url, 'r')
+    return open(url, 'r')
+
+
+def iter_dimacs(url, chunk_size=1 << 16):
+    """
+    Streams the dimacs file (plain, .gz or .xz). Yields
+      ('c', id, name) for each feature name line,
+      ('p', featureNum, cnfNum) for the problem line,
+      ('cnfs', lits, lens) for every chunk of about chunk_size clause lines. lits is the int32 literals of the chunk
+       (the ending 0s removed), lens is the length of each clause.
+    Clause lines are parsed in bulk by numpy. No per-clause list is built.
+    """
     feature_name_pattern = re.compile(r'c (\d+)\$? (\w+)\n')
     stat_line_pattern = re.compile(r'p cnf (\d+) (\d+)\n')
-    with open(url, 'r') as f:
-        features_names_dict = dict()
 
+    def parse(lines, pending):
+        nums = np.fromstring(' '.join(lines), dtype=np.int32, sep=' ')
+        if len(pending):
+            nums = np.concatenate([pending, nums])
+        ends = np.flatnonzero(nums == 0)
+        if len(ends) == 0:
+            return None, nums
+        lens = np.diff(np.concatenate([[-1], ends])) - 1
+        lits = nums[:ends[-1]]
+        return (lits[lits != 0], lens.astype(np.int32)), nums[ends[-1]+1:]
+
+    buf = []
+    pending = np.zeros(0, dtype=np.int32)  # literals of a clause continuing on the next chunk
+    with open_dimacs(url) as f:
         for line in f:
             if line.startswith('c'):  # record the feature names
                 m = feature_name_pattern.match(line)
-                """
-                m.group(1) id
-                m.group(2) name
-                """
-                features_names_dict[int(m.group(1))] = m.group(2)
-
+                if m:
+                    yield 'c', int(m.group(1)), m.group(2)
             elif line.startswith('p'):
                 m = stat_line_pattern.match(line)
-                """
-                m.group(1) feature number
-                m.group(2) cnf
-                """
-                featureNum = int(m.group(1))
-                cnfNum = int(m.group(2))
+                yield 'p', int(m.group(1)), int(m.group(2))
+            elif line.strip():  # the cnf
+                buf.append(line)
+                if len(buf) >= chunk_size:
+                    chunk, pending = parse(buf, pending)
+                    buf = []
+                    if chunk is not None:
+                        yield ('cnfs',) + chunk
+
+        chunk, pending = parse(buf, pending)
+        assert len(pending) == 0, "The last cnf is not ended with 0"
+        if chunk is not None:
+            yield ('cnfs',) + chunk
+
+
+def parse_dimacs_stream(url, chunk_size=1 << 16):
+    """
+    Parses the dimacs file into packed arrays. The literal array grows in place, so the peak memory stays close to
+    the final array size.
+    :return: feature_names, featureNum, lits, offsets, cnfNum. see load_product_arrays
+    """
+    features_names_dict = dict()
+    featureNum = cnfNum = None
+    lits = np.zeros(chunk_size, dtype=np.int32)
+    litNum = clauseNum = 0
+    lens = []
+
+    for item in iter_dimacs(url, chunk_size):
+        if item[0] == 'c':
+            features_names_dict[item[1]] = item[2]
+        elif item[0] == 'p':
+            _, featureNum, cnfNum = item
+        else:
+            _, chunk_lits, chunk_lens = item
+            lens.append(chunk_lens)
+            clauseNum += len(chunk_lens)
+            assert cnfNum is None or clauseNum <= cnfNum, "Unmatched cnfNum."
+            if litNum + len(chunk_lits) > len(lits):
+                lits.resize(max(2 * len(lits), litNum + len(chunk_lits)), refcheck=False)
+            lits[litNum:litNum+len(chunk_lits)] = chunk_lits
+            litNum += len(chunk_lits)
+
+    assert featureNum is not None, "No problem line (p cnf ...) in " + url
+    # transfer the features_names into the list if dimacs file is valid
+    assert len(features_names_dict) == featureNum, "There exists some features without any name"
+    feature_names = [features_names_dict[i] for i in range(1, featureNum+1)]
+
+    lens = np.concatenate(lens) if lens else np.zeros(0, dtype=np.int32)
+    assert len(lens) == cnfNum, "Unmatched cnfNum."
+    lits.resize(litNum, refcheck=False)
+    offsets = np.zeros(cnfNum+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lens)
+
+    return feature_names, featureNum, lits, offsets, cnfNum
+
+
+def load_augment(url, featureNum):
+    """
+    Loads the <url>.augment file. Each line (except the # comments) is FEATURE_INDEX(start at 1) COST USED_BEFORE DEFECTS
+    :return: cost (float64), used_before (bool), defects (int32). arrays of length featureNum
+    """
+    with open(url + '.augment', 'r') as f:
+        text = ' '.join(l for l in f if not l.startswith('#'))
+    table = np.fromstring(text, dtype=np.float64, sep=' ').reshape(-1, 4)
+    index = table[:, 0].astype(np.int64) - 1
+
+    cost = np.zeros(featureNum, dtype=np.float64)
+    used_before = np.zeros(featureNum, dtype=bool)
+    defects = np.zeros(featureNum, dtype=np.int32)
+    cost[index] = table[:, 1]
+    used_before[index] = table[:, 2] != 0
+    defects[index] = table[:, 3]
+    return cost, used_before, defects
+
+
+def load_objective_bounds(url, use_cache=True):
+    """
+    Normalization bounds of the objectives (convio, unselected, unused, defect, cost), i.e.
+    [cnfNum, featureNum, featureNum, sum(defects), sum(cost)]. Kept in <url>.bounds, which also records the size and
+    mtime of the dimacs and augment files it comes from.
+    :return: float64 array
+    """
+    src = _find_source(url)
+    url = re.sub(r'\.(gz|xz)$', '', url)
+    stamp = '# ' + ' '.join('%d %r' % (st.st_size, st.st_mtime) for st in map(os.stat, [src, url + '.augment']))
+    if use_cache:
+        try:
+            with open(url + '.bounds', 'r') as f:
+                lines = f.read().split('\n')
+            if lines[0] == stamp:
+                return np.array([float(x) for x in lines[1].split()])
+        except (IOError, OSError, IndexError, ValueError):
+            pass
 
-                # transfer the features_names into the list if dimacs file is valid
-                assert len(features_names_dict) == featureNum, "There exists some features without any name"
-                for i in range(1, featureNum+1):
-                    feature_names.append(features_names_dict[i])
-                del features_names_dict
+    _, featureNum, _, _, cnfNum = load_product_arrays(url, use_cache)
+    cost, _, defects = load_augment(url, featureNum)
+    bounds = np.array([cnfNum, featureNum, featureNum, int(defects.sum()), sum(cost.tolist())], dtype=np.float64)
+    if use_cache:
+        text = stamp + '\n' + ' '.join(repr(float(b)) for b in bounds) + '\n'
+        _write_atomic(url + '.bounds', [text.encode('ascii')])
+    return bounds
 
-            elif line.endswith('0\n'):  # the cnf
-                cnfs.append(map(int, line[:-1].split(' '))[:-1])  # delete the 0, store as the lint list
 
-            else:
-                assert True, "Unknown line" + line
+def load_fixed_features(url):
+    """
+    Loads the <url>.mandatory and <url>.dead sidecars (one feature index per line, start at 1). Missing files are
+    taken as empty.
+    :return: mandatory, dead. both are lists of feature indices, start at 0
+    """
+    res = []
+    for ext in ['.mandatory', '.dead']:
+        try:
+            with open(url + ext, 'r') as f:
+                res.append([int(l) - 1 for l in f if l.strip()])
+        except IOError:
+            res.append([])
+    return res[0], res[1]
 
-        assert len(cnfs) == cnfNum, "Unmatched cnfNum."
 
-        return feature_names, featureNum, cnfs, cnfNum
+def save_fixed_features(url, mandatory, dead):
+    """
+    Writes the <url>.mandatory and <url>.dead sidecars, the format load_fixed_features reads
+    :param mandatory: feature indices, start at 0
+    :param dead: feature indices, start at 0
+    """
+    for ext, features in [('.mandatory', mandatory), ('.dead', dead)]:
+        with open(url + ext, 'w') as f:
+            f.write(''.join('%d\n' % (i + 1) for i in sorted(features)))
 
 
 def demo(name):
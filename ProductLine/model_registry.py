@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+
+from __future__ import division
+import glob
+import re
+import sys
+from os import path
+from deap import creator
+
+sys.dont_write_bytecode = True
+
+"""
+Process-wide registry of the product line models.
+Models are loaded lazily and kept for the life of the process, so scripts looping over the models (or calling into
+each other) parse every dimacs/augment file once. The parsed cnfs also come from the compiled on-disk cache of
+dimacs_parser unless use_cache=False.
+"""
+
+PROJECT_PATH = path.dirname(path.dirname(path.abspath(__file__)))
+
+_models = dict()
+_created = dict()
+_bounds = dict()
+
+
+def create_once(name, base, **kargs):
+    """
+    Same as deap's creator.create, but skips the creation (and the DEAP warning about overwriting) if the class has
+    been created here with the same base and attributes.
+    :return: the class
+    """
+    spec = (base, sorted(kargs.items()))
+    if name not in _created or _created[name] != spec or getattr(creator, name, None) is None:
+        creator.create(name, base, **kargs)
+        _created[name] = spec
+    return getattr(creator, name)
+
+
+def get_model(name, reducedDec=False, use_cache=True):
+    """
+    :return: the DimacsModel of dimacs_data/<name>.dimacs, loaded at the first call
+    """
+    key = (name, reducedDec)
+    if key not in _models:
+        from ProductLine.DimacsModel import DimacsModel
+        _models[key] = DimacsModel(name, reducedDec=reducedDec, use_cache=use_cache)
+    return _models[key]
+
+
+def get_objective_bounds(name):
+    """
+    :return: normalization bounds of the objectives of the model, see dimacs_parser.load_objective_bounds. memoized
+    """
+    if name not in _bounds:
+        from ProductLine.dimacs_parser import load_objective_bounds
+        _bounds[name] = load_objective_bounds("{0}/dimacs_data/{1}.dimacs".format(PROJECT_PATH, name))
+    return _bounds[name]
+
+
+def available_models():
+    """:return: names of the models in dimacs_data that can be loaded (plain or compressed dimacs files)"""
+    names = set()
+    for f in glob.glob(PROJECT_PATH + '/dimacs_data/*.dimacs*'):
+        m = re.match(r'(.+)\.dimacs(\.gz|\.xz)?$', path.basename(f))
+        if m and path.exists(PROJECT_PATH + '/dimacs_data/' + m.group(1) + '.dimacs.augment'):
+            names.add(m.group(1))
+    return sorted(names)
+
+
+def get_models(names=None, reducedDec=False):
+    """:return: dict name -> DimacsModel for the given names (all available models by default)"""
+    if names is None:
+        names = available_models()
+    return dict((name, get_model(name, reducedDec)) for name in names)
+
+
+def forget(name=None):
+    """drop the cached model(s) of name, or all models if name is None"""
+    for key in list(_models.keys()):
+        if name is None or key[0] == name:
+            del _models[key]
+    for key in list(_bounds.keys()):
+        if name is None or key == name:
+            del _bounds[key]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+
+from __future__ import division
+import sys
+from multiprocessing import Pool, cpu_count
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+sys.dont_write_bytecode = True
+
+"""
+Process pool evaluation for DimacsModel.
+The packed cnfs and the cost/used_defects/unused_before vectors are copied once into shared memory before the workers are
+forked. Workers view them as numpy arrays, so only the individuals (as one joined '0'/'1' buffer per task) and the
+objective tuples cross the process boundary.
+"""
+
+SHARED_ATTRS = ['cnf_vars', 'cnf_signs', 'cnf_width_counts', 'cost', 'used_defects', 'unused_before']
+
+_worker_model = None
+
+
+def _to_shared(arr):
+    arr = np.ascontiguousarray(arr)
+    raw = RawArray('b', max(1, arr.nbytes))
+    np.frombuffer(raw, dtype=np.uint8, count=arr.nbytes)[:] = arr.view(np.uint8).ravel()
+    return raw, arr.dtype.str, arr.shape
+
+
+def _from_shared(raw, dtype, shape):
+    count = int(np.prod(shape))
+    return np.frombuffer(raw, dtype=dtype, count=count).reshape(shape)
+
+
+def _init_worker(model_class, featureNum, cnfNum, shared):
+    global _worker_model
+    _worker_model = model_class.__new__(model_class)
+    _worker_model.featureNum, _worker_model.cnfNum = featureNum, cnfNum
+    for name, (raw, dtype, shape) in shared.items():
+        setattr(_worker_model, name, _from_shared(raw, dtype, shape))
+
+
+def _eval_chunk(buf):
+    pop = (np.frombuffer(buf, dtype=np.uint8) - ord('0')).reshape(-1, _worker_model.featureNum)
+    return _worker_model.objectives(pop)
+
+
+class PoolMap(object):
+    """
+    A drop-in replacement of toolbox.map (DimacsModel.parallelize registers it).
+    Mapping the model's evaluate function is done by the workers over shared memory, and the fitness values are set
+    to the individuals. Any other function is sent to the pool as pool.map does (so it has to be picklable).
+    """
+
+    def __init__(self, model, processes=None, chunksize=None):
+        """
+        :param processes: number of workers. cpu_count() by default
+        :param chunksize: number of individuals per task. By default, splitting the population into 4 tasks per worker
+        """
+        self.model = model
+        self.processes = processes or cpu_count()
+        self.chunksize = chunksize
+        shared = dict((name, _to_shared(np.asarray(getattr(model, name)))) for name in SHARED_ATTRS)
+        self.pool = Pool(self.processes, initializer=_init_worker,
+                         initargs=(model.__class__, model.featureNum, model.cnfNum, shared))
+
+    def _chunksize(self, n):
+        return self.chunksize or max(1, -(-n // (4 * self.processes)))
+
+    def is_evaluate(self, func):
+        func = getattr(func, 'func', func)  # functions registered in the toolbox are wrapped by partial
+        return func == self.model.eval_ind or func == self.model.eval_population
+
+    def __call__(self, func, iterable):
+        inds = list(iterable)
+        if not self.is_evaluate(func):
+            return self.pool.map(func, inds, self._chunksize(len(inds)))
+
+        size = self._chunksize(len(inds))
+        tasks = []
+        for start in range(0, len(inds), size):
+            buf = ''.join(map(str, inds[start:start+size]))
+            tasks.append(buf if isinstance(buf, bytes) else buf.encode('ascii'))
+        res = []
+        for fits in self.pool.map(_eval_chunk, tasks, 1):
+            res.extend(fits)
+        for ind, fit in zip(inds, res):
+            ind.fitness.values = fit
+        return res
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+from __future__ import division
+import random
+import sys
+import numpy as np
+from ProductLine.BitIndividual import BitIndividual
+
+sys.dont_write_bytecode = True
+
+"""
+Repairing invalid configurations of a DimacsModel with few flips.
+* WalkSAT, seeded from the violated cnfs: pick a random violated cnf, flip one of its features. A feature whose flip
+  breaks no satisfied cnf is taken first; otherwise, with probability noise a random feature of the cnf, else the one
+  breaking the fewest cnfs. Ties go to the features flipped before, i.e. back to the original value.
+* if max_flips is reached, a SAT call from the original values: the features out of the violated cnfs keep them
+  (as assumptions, dropped only if that is unsatisfiable), and with python-sat they are also the preferred phases.
+The cores/deads of a reducedDec model are set first. They are counted in the flips.
+"""
+
+
+class WalkSATRepair(object):
+    def __init__(self, model, noise=0.2, max_flips=None, seed=None):
+        """
+        :param model: a DimacsModel
+        :param noise: probability of a random walk step when every feature of the cnf breaks something
+        :param max_flips: WalkSAT steps before the SAT fallback. default: 10 * featureNum
+        """
+        self.model = model
+        self.noise = noise
+        self.max_flips = max_flips if max_flips is not None else 10 * model.featureNum
+        self.rand = random.Random(seed)
+        self.cnfs = [[abs(x) - 1 for x in c] for c in model.cnfs]
+        self.occ = [list(zip(model.occ_cnfs[a:b].tolist(), model.occ_signs[a:b].tolist()))
+                    for a, b in zip(model.occ_ptr[:-1].tolist(), model.occ_ptr[1:].tolist())]
+        self.solver = None
+        self.fallbacks = 0
+
+    def _breaks(self, bits, counts, v):
+        """:return: number of satisfied cnfs which would be violated by flipping feature v"""
+        val = bits[v]
+        return sum(1 for c, s in self.occ[v] if s == val and counts[c] == 1)
+
+    def _flip(self, bits, counts, unsat, where, v):
+        val = bits[v] ^ 1
+        bits[v] = val
+        for c, s in self.occ[v]:
+            if s == val:
+                counts[c] += 1
+                if counts[c] == 1:  # swap-remove c from unsat
+                    i, last = where.pop(c), unsat.pop()
+                    if last != c:
+                        unsat[i] = last
+                        where[last] = i
+            else:
+                counts[c] -= 1
+                if counts[c] == 0:
+                    where[c] = len(unsat)
+                    unsat.append(c)
+
+    def walk(self, bits, counts, violated):
+        """
+        WalkSAT on bits (list of 0/1), updated in place, as well as counts (list, see DimacsModel.sat_counts)
+        :return: whether all cnfs are satisfied
+        """
+        unsat = list(violated)
+        where = dict((c, i) for i, c in enumerate(unsat))
+        flipped = set()
+        rand = self.rand
+        steps = 0
+        while unsat and steps < self.max_flips:
+            steps += 1
+            c = unsat[rand.randrange(len(unsat))]
+            best, best_key = None, None
+            for v in self.cnfs[c]:
+                key = (self._breaks(bits, counts, v), v not in flipped)
+                if best_key is None or key < best_key:
+                    best, best_key = v, key
+            if best_key[0] > 0 and rand.random() < self.noise:
+                best = rand.choice(self.cnfs[c])
+            self._flip(bits, counts, unsat, where, best)
+            flipped ^= set([best])
+        return not unsat
+
+    def solve_near(self, bits, violated):
+        """
+        SAT call preferring the values in bits
+        :param violated: indices of the cnfs violated by bits. their features are left free
+        :return: 0/1 list of a valid configuration
+        """
+        from SAT_Guide.incremental import IncrementalSolver, HAS_PYSAT
+        model = self.model
+        if self.solver is None:
+            self.solver = IncrementalSolver(list(model.cnfs), model.featureNum,
+                                            backend='pysat' if HAS_PYSAT else 'pycosat')
+        lits = [i + 1 if b else -i - 1 for i, b in enumerate(bits)]
+        self.solver.set_phases(lits)
+        free = set(v for c in violated for v in self.cnfs[c])
+        sol = self.solver.solve([x for x in lits if abs(x) - 1 not in free])
+        if sol is None:
+            sol = self.solver.solve()
+        if sol is None:
+            raise ValueError("%s has no valid configuration" % model.name)
+        self.fallbacks += 1
+        return [int(x > 0) for x in sol]
+
+    def repair(self, ind, violated=None):
+        """
+        :param ind: str individual or BitIndividual. Not modified.
+        :param violated: indices of the cnfs violated by ind (see DimacsModel.violated_cnfs). Computed if None.
+        :return: valid individual of the same type (fitness not evaluated), number of features changed.
+         ind itself if it is valid already.
+        """
+        model = self.model
+        orig = model.pop_matrix([ind])[0]
+        bits = orig.copy()
+        bits[model.cores] = 1
+        bits[model.deads] = 0
+        forced = (bits != orig).any()
+        # the cnfs of a reducedDec model hold the cores/deads as units, so forcing them changes the counts
+        counts = model.sat_counts(bits)
+        if violated is None or forced:
+            violated = model.violated_cnfs(counts)
+        if len(violated) == 0 and not forced:
+            return ind, 0
+
+        start, bits, counts = bits.tolist(), bits.tolist(), counts.tolist()
+        if not self.walk(bits, counts, violated):
+            bits = self.solve_near(start, violated)
+        bits = np.array(bits, dtype=np.uint8)
+        nflips = int((bits != orig).sum())
+
+        if isinstance(ind, BitIndividual):
+            return model.BitIndividual(bits), nflips
+        res = (bits + ord('0')).tobytes()
+        return model.Individual(res if isinstance(res, str) else res.decode('ascii')), nflips
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+from __future__ import division
+import os
+import sys
+import numpy as np
+from ProductLine.dimacs_parser import load_fixed_features, save_fixed_features
+from ProductLine.model_registry import PROJECT_PATH
+from SAT_Guide.incremental import IncrementalSolver, HAS_PYSAT
+
+sys.dont_write_bytecode = True
+
+"""
+Backbone of a feature model: the features taking the same value in every valid configuration (mandatory ones are
+always selected, dead ones never).
+Iterative filtering: the candidates are the literals of a first solution. For a candidate l, solve under the assumption
+-l. If unsatisfiable, l is in the backbone and is added as a unit cnf (helps the next calls). Otherwise, the candidates
+missing in the new solution are dropped at once. So the number of solver calls is at most the number of features, far
+fewer in practice (ecos: 450 calls for 1244 features).
+"""
+
+
+def compute_backbone(cnfs, featureNum, units=(), backend=None):
+    """
+    :param cnfs: list of int lists (dimacs literals). Not modified.
+    :param units: literals known to hold (e.g. the cores/deads of a reduced model)
+    :param backend: IncrementalSolver backend. default: pysat if installed, else the non-incremental pycosat mode
+     (same result, each call re-solves the whole cnf)
+    :return: backbone literals (dimacs), sorted by feature, and the number of solver calls
+    """
+    if backend is None:
+        backend = 'pysat' if HAS_PYSAT else 'pycosat'
+    solver = IncrementalSolver(list(cnfs), featureNum, backend=backend)
+    try:
+        for x in units:
+            solver.add([x])
+        sol = solver.solve()
+        calls = 1
+        if sol is None:
+            raise ValueError("The cnfs are not satisfiable")
+
+        # a feature in no cnf (and not fixed) can take both values
+        used = np.zeros(featureNum + 1, dtype=bool)
+        for c in cnfs:
+            used[np.abs(c)] = True
+        used[np.abs(np.array(list(units), dtype=np.int64))] = True
+        candidates = set(x for x in sol if used[abs(x)])
+
+        res = set(units)
+        while candidates:
+            x = candidates.pop()
+            if x in res:
+                continue
+            other = solver.solve([-x])
+            calls += 1
+            if other is None:
+                res.add(x)
+                solver.add([x])
+            else:
+                candidates.intersection_update(other)
+    finally:
+        solver.delete()
+    return sorted(res, key=abs), calls
+
+
+def _sidecars_fresh(url):
+    """:return: whether both sidecars exist and are not older than the dimacs file"""
+    try:
+        src = os.path.getmtime(url)
+        return all(os.path.getmtime(url + ext) >= src for ext in ['.mandatory', '.dead'])
+    except OSError:
+        return False
+
+
+def backbone(model, use_cache=True):
+    """
+    Backbone of a DimacsModel (the full feature model, whether reducedDec or not).
+    The result is cached in the <dimacs>.mandatory/.dead sidecars, which DimacsModel(reducedDec=True) reads.
+    :param use_cache: if False, always recompute (and rewrite the sidecars if they differ)
+    :return: mandatory, dead. both are sorted lists of feature indices, start at 0
+    """
+    url = "{0}/dimacs_data/{1}.dimacs".format(PROJECT_PATH, model.name)
+    if use_cache and _sidecars_fresh(url):
+        mandatory, dead = load_fixed_features(url)
+        return sorted(mandatory), sorted(dead)
+
+    units = [i + 1 for i in model.cores] + [-i - 1 for i in model.deads]
+    lits, _ = compute_backbone(model.cnfs, model.featureNum, units)
+    mandatory = [x - 1 for x in lits if x > 0]
+    dead = [-x - 1 for x in lits if x < 0]
+
+    # the sidecars are under version control. keep them (and their line order) when nothing changed
+    old_mandatory, old_dead = load_fixed_features(url)
+    if sorted(old_mandatory) != mandatory or sorted(old_dead) != dead:
+        save_fixed_features(url, mandatory, dead)
+    else:
+        # checked against the current dimacs. touch them, or they stay older and get recomputed on every call
+        try:
+            for ext in ['.mandatory', '.dead']:
+                os.utime(url + ext, None)
+        except OSError:
+            pass
+    return mandatory, dead
+
+
+def free_features(model, use_cache=True):
+    """:return: indices (start at 0) of the features not in the backbone"""
+    mandatory, dead = backbone(model, use_cache)
+    fixed = set(mandatory) | set(dead)
+    return [i for i in range(model.featureNum) if i not in fixed]
+
+
+if __name__ == '__main__':
+    from ProductLine.model_registry import available_models, get_model
+    for name in available_models():
+        m, d = backbone(get_model(name), use_cache=False)
+        print('%s: %d mandatory, %d dead' % (name, len(m), len(d)))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+
+from __future__ import division
+import itertools
+import sys
+import pycosat
+
+try:
+    from pysat.solvers import Solver as PySATSolver
+except ImportError:
+    PySATSolver = None
+
+HAS_PYSAT = PySATSolver is not None
+
+sys.dont_write_bytecode = True
+
+"""
+Incremental SAT solving over one set of base cnfs, with a stack of constraint frames.
+
+* units added to a frame are passed to the solver as assumptions while the frame is on the stack.
+* other cnfs added to a frame are guarded by a fresh selector variable s (stored as cnf + [-s]), and s is assumed
+  while the frame is on the stack. Popping the frame adds the unit [-s], which retires them for good.
+
+The incremental backend is python-sat (pysat): one solver instance keeps its state (learnt clauses included) across
+calls, and a call only costs the new constraints. It is required unless the caller asks for backend='pycosat', a
+NON-incremental mode with the same interface: the base cnfs are never copied nor grown, but pycosat loads them all
+again at every call, so a call costs as much as solving from scratch.
+"""
+
+
+class IncrementalSolver(object):
+    def __init__(self, cnfs, featureNum, backend='pysat', solver_name='m22'):
+        """
+        :param cnfs: base cnfs, list of int lists (dimacs literals)
+        :param featureNum: solutions are reported over features 1..featureNum
+        :param backend: 'pysat' (incremental, needs python-sat) or 'pycosat' (non-incremental, see above)
+        :param solver_name: pysat solver name
+        """
+        assert backend in ('pysat', 'pycosat'), "Unknown backend " + str(backend)
+        if backend == 'pysat' and not HAS_PYSAT:
+            raise ImportError("IncrementalSolver needs python-sat (pip install python-sat). "
+                              "backend='pycosat' runs without it, but re-solves the whole cnf at every call")
+        self.backend = backend
+        self.featureNum = featureNum
+        self.top = max([featureNum] + [abs(x) for c in cnfs for x in c])  # largest variable in use
+        self.frames = []  # each frame: dict(units=[...], cnfs=[...], selector=s)
+        if backend == 'pysat':
+            self.solver = PySATSolver(name=solver_name, bootstrap_with=cnfs)
+        else:
+            self.base = cnfs
+            self.solver = None
+
+    def __len__(self):
+        """:return: number of frames on the stack"""
+        return len(self.frames)
+
+    def push(self):
+        self.top += 1
+        self.frames.append(dict(units=[], cnfs=[], selector=self.top))
+
+    def pop(self):
+        frame = self.frames.pop()
+        if self.backend == 'pysat':
+            self.solver.add_clause([-frame['selector']])
+
+    def add(self, cnf):
+        """add a cnf to the top frame (or to the base cnfs if there is no frame)"""
+        cnf = list(cnf)
+        if not self.frames:
+            if self.backend == 'pysat':
+                self.solver.add_clause(cnf)
+            else:
+                self.base.append(cnf)
+            return
+        frame = self.frames[-1]
+        if len(cnf) == 1:
+            frame['units'].append(cnf[0])
+            return
+        frame['cnfs'].append(cnf)
+        if self.backend == 'pysat':
+            self.solver.add_clause(cnf + [-frame['selector']])
+
+    def add_units(self, lits):
+        for x in lits:
+            self.add([x])
+
+    def assumptions(self, extra=()):
+        res = list(extra)
+        for frame in self.frames:
+            res.extend(frame['units'])
+            if frame['cnfs']:
+                res.append(frame['selector'])
+        return res
+
+    def solve(self, assumptions=(), prop_limit=0):
+        """
+        :param assumptions: literals assumed for this call only
+        :param prop_limit: max number of propagations of this call (0 for no limit)
+        :return: the solution (list of dimacs literals of features 1..featureNum), or None if unsatisfiable (or the
+         limit is hit)
+        """
+        assumptions = self.assumptions(assumptions)
+        if self.backend == 'pysat':
+            if prop_limit:
+                self.solver.prop_budget(prop_limit)
+                if not self.solver.solve_limited(assumptions=assumptions):
+                    return None
+            elif not self.solver.solve(assumptions=assumptions):
+                return None
+            model = self.solver.get_model()
+        else:
+            model = pycosat.solve(self._pycosat_cnfs(assumptions), prop_limit=prop_limit)
+            if not isinstance(model, list):
+                return None
+        return self._trim(model)
+
+    def _pycosat_cnfs(self, assumptions):
+        frame_cnfs = [c for frame in self.frames for c in frame['cnfs']]
+        return itertools.chain(self.base, frame_cnfs, [[x] for x in assumptions])
+
+    def _trim(self, model):
+        res = [-i for i in range(1, self.featureNum+1)]  # features in no cnf at all come out unselected
+        for x in model:
+            if abs(x) <= self.featureNum:
+                res[abs(x)-1] = x
+        return res
+
+    def itersolve(self, limit=None, assumptions=(), prop_limit=0):
+        """
+        Yields distinct solutions (at most limit). With pysat, blocking cnfs live in a temporary frame, popped at the
+        end. With pycosat, this is one pycosat.itersolve call.
+        :param prop_limit: max number of propagations of each solver call (0 for no limit)
+        """
+        if self.backend == 'pycosat':
+            seen = set()
+            for model in pycosat.itersolve(self._pycosat_cnfs(self.assumptions(assumptions)), prop_limit=prop_limit):
+                if limit is not None and len(seen) >= limit:
+                    break
+                sol = tuple(self._trim(model))
+                if sol not in seen:  # solutions only differing in the selector variables
+                    seen.add(sol)
+                    yield list(sol)
+            return
+
+        self.push()
+        try:
+            found = 0
+            while limit is None or found < limit:
+                sol = self.solve(assumptions, prop_limit)
+                if sol is None:
+                    break
+                found += 1
+                yield sol
+                self.add([-x for x in sol])
+        finally:
+            self.pop()
+
+    def set_phases(self, lits):
+        """preferred polarities of the next calls (pysat only; ignored by pycosat)"""
+        if self.backend == 'pysat':
+            self.solver.set_phases(lits)
+
+    def delete(self):
+        if self.solver is not None:
+            self.solver.delete()
+            self.solver = None
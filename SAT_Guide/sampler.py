@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+
+from __future__ import division
+import itertools
+import random
+import sys
+import time
+import numpy as np
+import pycosat
+from ProductLine.dimacs_parser import arrays_to_cnfs
+from SAT_Guide.incremental import IncrementalSolver, HAS_PYSAT
+
+sys.dont_write_bytecode = True
+
+"""
+Sampling many diverse valid configurations.
+Taking consecutive solutions of one solver run gives nearly identical configurations. Instead, every round
+  * randomizes the solver's choices.
+  * assumes a random cube, i.e. fixes a few random features to random values. The cube size adapts: halved when the
+    cube makes the model unsatisfiable, grown again after successes.
+With python-sat, the cnfs are loaded once into an IncrementalSolver: the cube is passed as assumptions and every round
+sets new random phases (preferred values) for all the features, so a round only costs its search.
+Without it, every round runs pycosat on a randomly relabeled copy of the cnfs plus the cube: features are shuffled
+(changes the decision order of the solver) and their polarities are randomly flipped (changes the default phase),
+redone every few rounds. pycosat encodes the whole cnfs again at every round, which bounds the throughput on large
+models (linux, freebsd).
+"""
+
+
+class SATSampler(object):
+    def __init__(self, model, seed=None, cube_size=8, sols_per_round=1, reshuffle_every=10, prop_limit=0,
+                 backend=None):
+        """
+        :param model: a DimacsModel. With reducedDec, the cubes only take the free features.
+        :param cube_size: initial (and max) number of features fixed by the random cube of each round
+        :param sols_per_round: solutions taken from each solver run
+        :param reshuffle_every: rounds between two relabelings (pycosat only)
+        :param prop_limit: propagation limit of each solver run (0 for no limit). A run hitting the limit is skipped.
+        :param backend: 'pysat' (IncrementalSolver) or 'pycosat'. default: pysat if installed
+        """
+        self.model = model
+        self.rand = random.Random(seed)
+        self.rng = np.random.RandomState(self.rand.randint(0, 2 ** 31 - 1))
+        self.max_cube_size = self.cube_size = cube_size
+        self.sols_per_round = sols_per_round
+        self.reshuffle_every = reshuffle_every
+        self.prop_limit = prop_limit
+
+        self.n = model.featureNum
+        self.cubable = list(getattr(model, 'free_features', range(self.n)))
+        self.lits = np.asarray(model.cnf_lits, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(model.cnf_lens)])
+        self.backend = backend or ('pysat' if HAS_PYSAT else 'pycosat')
+        self.solver = IncrementalSolver(list(model.cnfs), self.n) if self.backend == 'pysat' else None
+        self.rounds = 0
+        self.solutions = 0
+        self.seconds = 0.0
+        self.last_rate = 0.0
+
+    def reshuffle(self):
+        """relabel feature i (start at 0) into solver variable perm[i] (start at 1), with polarity flip[i]"""
+        self.perm = self.rng.permutation(self.n) + 1
+        self.flip = self.rng.randint(0, 2, self.n) * 2 - 1
+        signed = (self.perm * self.flip)[np.abs(self.lits) - 1] * np.sign(self.lits)
+        self.cnfs = arrays_to_cnfs(signed, self.offsets)
+
+    def decode(self, sol):
+        """solver solution of the relabeled cnfs -> '0'/'1' string of the features"""
+        values = np.asarray(sol)[self.perm - 1] > 0
+        values ^= self.flip < 0
+        res = (values.astype(np.uint8) + ord('0')).tobytes()
+        return res if isinstance(res, str) else res.decode('ascii')
+
+    def cube(self):
+        chosen = self.rand.sample(self.cubable, min(self.cube_size, len(self.cubable)))
+        return [[int(self.perm[i] * self.flip[i]) * self.rand.choice([1, -1])] for i in chosen]
+
+    def one_round(self):
+        """:return: list of solutions found in one round. empty if the cube makes it unsatisfiable"""
+        if self.solver is not None:
+            return self.one_incremental_round()
+        if self.rounds % self.reshuffle_every == 0:
+            self.reshuffle()
+        self.rounds += 1
+
+        res = []
+        # vars: pycosat only reports up to the highest variable in the cnfs, features in no cnf may be relabeled above it
+        cnfs = itertools.chain(self.cnfs, self.cube())
+        for sol in pycosat.itersolve(cnfs, vars=self.n, prop_limit=self.prop_limit):
+            res.append(self.decode(sol))
+            if len(res) >= self.sols_per_round:
+                break
+        self.adapt_cube(res)
+        return res
+
+    def one_incremental_round(self):
+        """one_round on the IncrementalSolver: random phases, the cube as assumptions"""
+        self.rounds += 1
+        signs = self.rng.randint(0, 2, self.n) * 2 - 1
+        self.solver.set_phases((np.arange(1, self.n + 1) * signs).tolist())
+        chosen = self.rand.sample(self.cubable, min(self.cube_size, len(self.cubable)))
+        cube = [(int(i) + 1) * self.rand.choice([1, -1]) for i in chosen]
+
+        res = []
+        for sol in self.solver.itersolve(self.sols_per_round, cube, self.prop_limit):
+            values = ((np.asarray(sol) > 0).astype(np.uint8) + ord('0')).tobytes()
+            res.append(values if isinstance(values, str) else values.decode('ascii'))
+        self.adapt_cube(res)
+        return res
+
+    def adapt_cube(self, res):
+        if res:
+            self.cube_size = min(self.max_cube_size, self.cube_size + 1)
+        else:
+            self.cube_size //= 2
+
+    def sample(self, N, max_rounds=None):
+        """
+        :return: N distinct valid configurations, as model.Individual. Fewer if the model has fewer solutions than N or
+         max_rounds (default 10*N) is reached.
+        """
+        start = time.time()
+        max_rounds = max_rounds or 10 * N
+        found = set()
+        res = []
+        for _ in range(max_rounds):
+            for sol in self.one_round():
+                if sol not in found:
+                    found.add(sol)
+                    res.append(self.model.Individual(sol))
+            if len(res) >= N:
+                break
+        res = res[:N]
+
+        seconds = time.time() - start
+        self.solutions += len(res)
+        self.seconds += seconds
+        self.last_rate = len(res) / seconds if seconds else float('inf')
+        return res
+
+    def throughput(self):
+        """:return: solutions per second over all sample calls"""
+        return self.solutions / self.seconds if self.seconds else 0.0
@@ -21,10 +21,11 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 #  THE SOFTWARE.
 
-from ProductLine.DimacsModel import DimacsModel
+from ProductLine.model_registry import get_model
 from operator import itemgetter
 from copy import deepcopy
-import pycosat
+from SAT_Guide.backbone import backbone
+from SAT_Guide.incremental import IncrementalSolver, HAS_PYSAT
 import pdb
 
 
@@ -39,17 +40,18 @@ def pycosatSol2binstr(sol):
     return ''.join(res)
 
 
-model = DimacsModel('ecos')
+model = get_model('ecos')
 inds = []
-i = 0
-cnfs = deepcopy(model.cnfs)
+fixed = []
+# the rounds are incremental with python-sat only. pycosat is opted in as the non-incremental fallback
+solver = IncrementalSolver(deepcopy(model.cnfs), model.featureNum, backend='pysat' if HAS_PYSAT else 'pycosat')
+
+# the backbone features never vary. fixing them in the base cnfs saves the solver from finding them again
+mandatory, dead = backbone(model)
+solver.add_units([i+1 for i in mandatory] + [-i-1 for i in dead])
 
 while True:
-    sat_engine = pycosat.itersolve(cnfs)
-    i = 0
-    for sol in sat_engine:
-        i += 1
-        if i > 100: break
+    for sol in solver.itersolve(100):
         inds.append(model.Individual(pycosatSol2binstr(sol)))
     tmp = map(list, zip(*inds))
     tmp = map(lambda x:len(set(x)), tmp)
@@ -57,14 +59,18 @@ while True:
 
     print(group1)
 
-    addition = []
     for i, j in zip(group1, itemgetter(*group1)(inds[0])):
         if j == '0':
-            addition.append([-i-1])
+            fixed.append(-i-1)
         else:
-            addition.append([i+1])
+            fixed.append(i+1)
 
-    cnfs = cnfs + addition
+    # one frame at a time, holding all the features fixed so far as assumptions. the frame of the previous round is
+    # popped first, so nothing piles up in the solver. (with the pycosat fallback every solve reloads the whole cnf)
+    if len(solver):
+        solver.pop()
+    solver.push()
+    solver.add_units(fixed)
     inds = []
 
 #!/usr/bin/env python
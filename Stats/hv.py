@@ -17,6 +17,10 @@
 
 __author__ = "Simon Wessing"
 
+import math
+from collections import Counter
+import numpy as np
+
 
 class HyperVolume:
     """
@@ -169,6 +173,332 @@ class HyperVolume:
 
 
 
+class WFGHyperVolume:
+    """
+    Hypervolume computation based on the WFG algorithm:
+    L. While, L. Bradstreet, and L. Barone. A fast way of calculating exact
+    hypervolumes. IEEE Transactions on Evolutionary Computation, 16(1):86-95,
+    2012.
+
+    Same interface as HyperVolume, points are held in numpy arrays. The
+    volume is the sum of the exclusive contributions of the points, sorted by
+    the last objective. The limit set of each point then shares that last
+    objective, so the recursion drops one dimension per level (slicing). Two
+    and three dimensions are computed directly by sweeping.
+
+    Minimization is implicitly assumed here!
+
+    """
+
+    def __init__(self, referencePoint):
+        """Constructor."""
+        self.referencePoint = referencePoint
+
+
+    def compute(self, front):
+        """Returns the hypervolume that is dominated by a front.
+
+        Points not weakly dominating the reference point are ignored. The
+        points are translated (and mirrored) so that the reference point is
+        the origin, and every point spans the box between the origin and
+        itself.
+
+        """
+        referencePoint = np.asarray(self.referencePoint, dtype=np.float64)
+        points = np.asarray(front, dtype=np.float64).reshape(-1, len(referencePoint))
+        points = points[(points <= referencePoint).all(axis=1)]
+        if len(points) == 0:
+            return 0.0
+        return self.wfg(self.nonDominated(referencePoint - points))
+
+
+    def wfg(self, points):
+        """Volume of the union of the boxes [0, point]."""
+        length, dimensions = points.shape
+        if length == 0:
+            return 0.0
+        elif length == 1:
+            return float(np.prod(points[0]))
+        elif dimensions == 1:
+            return float(points.max())
+        elif dimensions == 2:
+            return self.hv2d(points)
+        elif dimensions == 3:
+            return self.hv3d(points)
+
+        points = points[np.argsort(points[:, -1], kind='mergesort')]
+        heads = points[:, :-1]
+        hvol = 0.0
+        for k in xrange(length):
+            head = heads[k]
+            limitSet = np.minimum(heads[k+1:], head)
+            if dimensions > 4:
+                # the 2d and 3d sweeps take dominated points as they are
+                limitSet = self.nonDominated(limitSet)
+            hvol += points[k, -1] * (np.prod(head) - self.wfg(limitSet))
+        return hvol
+
+
+    @staticmethod
+    def nonDominated(points):
+        """Returns the non-dominated points (maximization), without duplicates."""
+        dimensions = points.shape[1]
+        points = points[np.argsort(-points.sum(axis=1), kind='mergesort')]
+        kept = []
+        while len(points):
+            # the first point has the largest sum, no other point dominates it
+            p = points[0]
+            kept.append(p)
+            points = points[1:][~(points[1:] <= p).all(axis=1)]
+        return np.array(kept).reshape(-1, dimensions)
+
+
+    @staticmethod
+    def hv2d(points):
+        """Sweep along the first coordinate, descending."""
+        points = points[np.argsort(-points[:, 0], kind='mergesort')]
+        heights = np.maximum.accumulate(points[:, 1])
+        steps = np.diff(np.concatenate([[0.0], heights]))
+        return float(np.dot(points[:, 0], steps))
+
+
+    @staticmethod
+    def hv3d(points):
+        """Sweep along the third coordinate, descending.
+
+        Between the k-th and the (k+1)-th values, the slice is the union of
+        the first k rectangles. heights[k, c] is the height of that union over
+        the c-th column of the compressed first coordinate.
+
+        """
+        points = points[np.argsort(-points[:, 2], kind='mergesort')]
+        columns = np.unique(points[:, 0])
+        widths = np.diff(np.concatenate([[0.0], columns]))
+        heights = np.where(points[:, 0][:, None] >= columns[None, :], points[:, 1][:, None], 0.0)
+        np.maximum.accumulate(heights, axis=0, out=heights)
+        depths = points[:, 2] - np.concatenate([points[1:, 2], [0.0]])
+        return float(np.dot(heights.dot(widths), depths))
+
+
+
+class MonteCarloHyperVolume:
+    """
+    Approximate hypervolume. Points are sampled uniformly in the box between
+    the ideal point of the front and the reference point. The hypervolume is
+    the box volume times the fraction of samples dominated by the front, with
+    a Wilson score interval on that fraction.
+
+    The time is linear in samples * len(front), whatever the dimension.
+
+    Minimization is implicitly assumed here!
+
+    """
+
+    def __init__(self, referencePoint, samples=100000, confidence=0.95, seed=None, chunkSize=1 << 22):
+        """Constructor.
+
+        samples: number of sampled points, the accuracy/time knob. The width
+            of the interval shrinks as 1/sqrt(samples).
+        chunkSize: max number of (sample, point) pairs being compared at once
+
+        """
+        self.referencePoint = referencePoint
+        self.samples = samples
+        self.confidence = confidence
+        self.rng = np.random.RandomState(seed)
+        self.chunkSize = chunkSize
+
+
+    def compute(self, front):
+        """Returns the estimated hypervolume."""
+        return self.computeWithInterval(front)[0]
+
+
+    def computeWithInterval(self, front):
+        """Returns the estimate, and the lower and upper bounds of the
+        confidence interval."""
+        referencePoint = np.asarray(self.referencePoint, dtype=np.float64)
+        points = np.asarray(front, dtype=np.float64).reshape(-1, len(referencePoint))
+        points = points[(points <= referencePoint).all(axis=1)]
+        if len(points) == 0:
+            return 0.0, 0.0, 0.0
+        ideal = points.min(axis=0)
+        boxVolume = float(np.prod(referencePoint - ideal))
+        if boxVolume == 0:
+            return 0.0, 0.0, 0.0
+
+        hits = 0
+        done = 0
+        batch = max(1, min(self.samples, self.chunkSize // len(points)))
+        while done < self.samples:
+            size = min(batch, self.samples - done)
+            samples = ideal + self.rng.random_sample((size, len(ideal))) * (referencePoint - ideal)
+            hits += int(self.dominated(points, samples).sum())
+            done += size
+
+        p = hits / float(self.samples)
+        low, high = self.wilson(p, self.samples, self.confidence)
+        return boxVolume * p, boxVolume * low, boxVolume * high
+
+
+    def dominated(self, points, samples):
+        """Returns the mask of the samples weakly dominated by some point."""
+        res = np.zeros(len(samples), dtype=bool)
+        block = max(1, self.chunkSize // len(samples))
+        for start in xrange(0, len(points), block):
+            todo = np.flatnonzero(~res)
+            if len(todo) == 0:
+                break
+            sub = samples[todo]
+            covered = points[start:start+block, 0][None, :] <= sub[:, 0][:, None]
+            for i in xrange(1, points.shape[1]):
+                covered &= points[start:start+block, i][None, :] <= sub[:, i][:, None]
+            res[todo[covered.any(axis=1)]] = True
+        return res
+
+
+    @staticmethod
+    def wilson(p, n, confidence):
+        """Wilson score interval of a proportion p observed on n trials."""
+        z = normalQuantile(0.5 + confidence / 2.0)
+        center = (p + z * z / (2.0 * n)) / (1 + z * z / n)
+        half = z / (1 + z * z / n) * math.sqrt(p * (1 - p) / n + z * z / (4.0 * n * n))
+        return max(0.0, center - half), min(1.0, center + half)
+
+
+def normalQuantile(q):
+    """Inverse of the standard normal cdf, by bisection on math.erf."""
+    low, high = -10.0, 10.0
+    for _ in xrange(100):
+        mid = (low + high) / 2.0
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < q:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+
+class IncrementalHyperVolume:
+    """
+    Hypervolume of a set of points changing a few points at a time. The
+    exclusive contribution of a point p to a set S is the volume of its box
+    minus the volume of the limit set {worse(p, q) : q in S}, computed by
+    WFGHyperVolume. So a change costs one pass over the set plus a WFG call
+    on the (usually small) non-dominated limit set, instead of a computation
+    from scratch.
+
+    Points need not be mutually non-dominated. Dominated points, duplicates
+    and points not dominating the reference point contribute 0.
+
+    Minimization is implicitly assumed here!
+
+    """
+
+    def __init__(self, referencePoint, front=()):
+        """Constructor."""
+        self.referencePoint = np.asarray(referencePoint, dtype=np.float64)
+        self.engine = WFGHyperVolume(referencePoint)
+        self.points = np.zeros((0, len(self.referencePoint)))
+        # boxes[i] is the box of points[i], translated so that the reference
+        # point is the origin (maximization), and clipped at the origin
+        self.boxes = np.zeros((0, len(self.referencePoint)))
+        self.volume = 0.0
+        for point in front:
+            self.add(point)
+
+
+    def __len__(self):
+        return len(self.points)
+
+
+    def box(self, point):
+        return np.maximum(self.referencePoint - np.asarray(point, dtype=np.float64), 0.0)
+
+
+    def exclusive(self, box, others):
+        """Volume dominated by box only, and not by any of the others."""
+        inclusive = float(np.prod(box))
+        if inclusive == 0 or len(others) == 0:
+            return inclusive
+        limitSet = WFGHyperVolume.nonDominated(np.minimum(others, box))
+        return inclusive - self.engine.wfg(limitSet)
+
+
+    def add(self, point):
+        """Adds point. Returns its exclusive contribution."""
+        box = self.box(point)
+        contribution = self.exclusive(box, self.boxes)
+        self.points = np.vstack([self.points, np.asarray(point, dtype=np.float64)])
+        self.boxes = np.vstack([self.boxes, box])
+        self.volume += contribution
+        return contribution
+
+
+    def remove(self, point):
+        """Removes (one copy of) point. Returns its exclusive contribution."""
+        found = np.flatnonzero((self.points == np.asarray(point, dtype=np.float64)).all(axis=1))
+        if len(found) == 0:
+            raise ValueError("IncrementalHyperVolume.remove(x): x not in the points")
+        return self.removeAt(found[0])
+
+
+    def removeAt(self, index):
+        box = self.boxes[index]
+        self.points = np.delete(self.points, index, axis=0)
+        self.boxes = np.delete(self.boxes, index, axis=0)
+        contribution = self.exclusive(box, self.boxes)
+        self.volume -= contribution
+        if len(self.points) == 0:
+            self.volume = 0.0
+        return contribution
+
+
+    def compute(self, front):
+        """Replaces the points by front, adding and removing only the
+        differences. Returns the hypervolume."""
+        wanted = Counter(tuple(map(float, point)) for point in front)
+        current = Counter(map(tuple, self.points.tolist()))
+        for point in current - wanted:
+            for _ in xrange((current - wanted)[point]):
+                self.remove(point)
+        for point in wanted - current:
+            for _ in xrange((wanted - current)[point]):
+                self.add(point)
+        return self.volume
+
+
+    def contributions(self):
+        """Returns the exclusive contribution of each point."""
+        res = np.zeros(len(self.points))
+        for i in xrange(len(self.points)):
+            res[i] = self.exclusive(self.boxes[i], np.delete(self.boxes, i, axis=0))
+        return res
+
+
+    def truncate(self, size):
+        """Removes the least contributing point until at most size points
+        are left. Returns the removed points.
+
+        Removing a point never lowers the contributions of the others, so
+        contributions computed before are lower bounds. Only the point with
+        the lowest bound is recomputed, until it is still the lowest.
+
+        """
+        removed = []
+        bounds = self.contributions() if len(self.points) > size else []
+        while len(self.points) > size:
+            worst = int(np.argmin(bounds))
+            bounds[worst] = self.exclusive(self.boxes[worst], np.delete(self.boxes, worst, axis=0))
+            if bounds[worst] > bounds.min():
+                continue
+            removed.append(self.points[worst].tolist())
+            self.removeAt(worst)
+            bounds = np.delete(bounds, worst)
+        return removed
+
+
+
 class MultiList:
     """A special data structure needed by FonsecaHyperVolume.
 
@@ -291,6 +621,29 @@ if __name__ == "__main__":
     front = [[1,0], [0,1], [1.5,1.5]]
     volume = hv.compute(front)
     print volume
-
-
-
+    print WFGHyperVolume(referencePoint).compute(front)
+    print MonteCarloHyperVolume(referencePoint, seed=1).computeWithInterval(front)
+
+    # cross check on the (valid) fitness of the j_res files, each objective
+    # scaled by its max in the file
+    import glob
+    import os
+    import time
+    for resFile in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'j_res', '*.txt'))):
+        lines = [l.rstrip() for l in open(resFile)]
+        start = lines.index("~~~")
+        fits = np.array([map(float, l.split()) for l in lines[start+1:-2]])
+        fits = fits[fits[:, 0] < 0.01]
+        if len(fits) == 0:
+            continue
+        fits = fits / np.maximum(fits.max(axis=0), 1e-12)
+        referencePoint = [1.01] * fits.shape[1]
+        t0 = time.time()
+        old = HyperVolume(referencePoint).compute(fits.tolist())
+        t1 = time.time()
+        new = WFGHyperVolume(referencePoint).compute(fits)
+        t2 = time.time()
+        estimate, low, high = MonteCarloHyperVolume(referencePoint, seed=1).computeWithInterval(fits)
+        t3 = time.time()
+        print "%-35s %5d points  %.12f  %.12f  %.3fs  %.3fs" % (os.path.basename(resFile), len(fits), old, new, t1-t0, t2-t1)
+        print "%-35s monte carlo  %.6f [%.6f, %.6f]  %.3fs" % ('', estimate, low, high, t3-t2)
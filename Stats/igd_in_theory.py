@@ -24,8 +24,7 @@
 
 from __future__ import division
 from os import path
-from deap import creator, base
-from deap.tools.emo import sortNondominated
+from Stats.reference_front import ReferenceArchive
 import glob
 import sys
 import pdb
@@ -44,53 +43,23 @@ folders = [PROJECT_PATH+'/j_res',
            '/Users/jianfeng/Desktop/hpc_jres']
 
 
-def _get_frontier(pop):
+def print_out_optimals(model_name):
     """
-    return the pareto frontier of the given pop. No duplicate individuals in the returns
-    :param pop:
-    :return:
+    merge the result files of model_name not seen before into its reference front and rewrite optimal_in_his
+    :return: number of result files merged
     """
-    front = sortNondominated(pop, len(pop), True)[0]
-    uniques = []
-    for f in front:
-        if f.fitness.values not in uniques:
-            uniques.append(f.fitness.values)
-    return uniques
-
-
-def print_out_optimals(model_name):
     files = []
     for fd in folders:
         files.extend(glob.glob(fd + '/*.txt'))
-    files = filter(lambda f: model_name in f, files)
-
-    valid_objs = set()
-    for records in files:
-        with open(records, 'r') as f:
-            lines = f.readlines()
-            lines = map(lambda x: x.rstrip(), lines)
-            start = lines.index("~~~")
-            fits = lines[start + 1:-2]
-            for fit in fits:
-                if fit.startswith('0.0'):
-                    valid_objs.add(fit)
-
-    valid_objs = map(lambda x: map(float, x.split(' ')), valid_objs)
-
-    creator.create("FitnessMin", base.Fitness, weights=[-1.0] * 5)
-    creator.create("Individual", list, fitness=creator.FitnessMin)
+    files = sorted(filter(lambda f: model_name in f, files))
 
-    pop = list()
-    for i in valid_objs:
-        ind = creator.Individual([])
-        ind.fitness = creator.FitnessMin(i)
-        pop.append(ind)
-    frontier = _get_frontier(pop)
+    archive = ReferenceArchive(model_name, PROJECT_PATH+'/optimal_in_his')
+    merged = archive.update(files)
+    if merged:
+        archive.save()
+        archive.write_text()
+    return merged
 
-    with open(PROJECT_PATH+'/optimal_in_his/'+model_name+'.txt', 'w') as f:
-        f.write('~~~\n')
-        for fer in frontier:
-            f.write(' '.join(map(str, fer)))
-            f.write('\n')
 
-print_out_optimals('linux')
+if __name__ == '__main__':
+    print_out_optimals('linux')
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+from __future__ import division
+import sys
+from math import hypot
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+sys.dont_write_bytecode = True
+
+
+"""
+Quality indicators of a front (objectives to be minimized) against a reference front, on numpy arrays.
+Point to front distances are computed by broadcasting, chunk by chunk, or by a KD-tree (scipy's cKDTree, if installed)
+when there are many pairs. gd and spread return the same values as DEAP's convergence and diversity.
+"""
+
+KDTREE_PAIRS = 1 << 24  # number of (point, reference point) pairs from which the KD-tree is used
+
+
+def _as_matrix(points):
+    return np.atleast_2d(np.asarray(points, dtype=np.float64))
+
+
+def min_distances(points, reference, chunk_size=1 << 22):
+    """
+    :param chunk_size: max number of pairs being computed at once
+    :return: for each point, the euclidean distance to its nearest reference point
+    """
+    points, reference = _as_matrix(points), _as_matrix(reference)
+    if cKDTree is not None and len(points) * len(reference) >= KDTREE_PAIRS:
+        return cKDTree(reference).query(points)[0]
+    res = np.empty(len(points))
+    step = max(1, chunk_size // len(reference))
+    for start in range(0, len(points), step):
+        diff = points[start:start + step, None, :] - reference[None, :, :]
+        res[start:start + step] = np.sqrt((diff * diff).sum(axis=2).min(axis=1))
+    return res
+
+
+def gd(front, reference):
+    """generational distance: mean distance from the front to the reference front (DEAP's convergence)"""
+    return sum(min_distances(front, reference).tolist()) / len(front)
+
+
+def igd(front, reference):
+    """inverted generational distance: mean distance from the reference front to the front"""
+    return sum(min_distances(reference, front).tolist()) / len(reference)
+
+
+def igd_plus(front, reference, chunk_size=1 << 22):
+    """
+    IGD+: as igd, but only the objectives where the front is worse than the reference point count in the distance
+    """
+    front, reference = _as_matrix(front), _as_matrix(reference)
+    res = np.empty(len(reference))
+    step = max(1, chunk_size // len(front))
+    for start in range(0, len(reference), step):
+        diff = np.maximum(front[None, :, :] - reference[start:start + step, None, :], 0)
+        res[start:start + step] = np.sqrt((diff * diff).sum(axis=2).min(axis=1))
+    return sum(res.tolist()) / len(reference)
+
+
+def epsilon(front, reference, chunk_size=1 << 22):
+    """additive epsilon indicator: smallest e such that every reference point is weakly dominated by a front point - e"""
+    front, reference = _as_matrix(front), _as_matrix(reference)
+    res = np.empty(len(reference))
+    step = max(1, chunk_size // len(front))
+    for start in range(0, len(reference), step):
+        res[start:start + step] = (front[None, :, :] - reference[start:start + step, None, :]).max(axis=2).min(axis=1)
+    return float(res.max())
+
+
+def spread(front, first, last):
+    """
+    Deb's spread (DEAP's diversity), on the first two objectives. front is taken in the given order.
+    :param first: the extreme points, only first[0], first[1] (and the same for last) are used
+    """
+    front = _as_matrix(front)[:, :2]
+    df = hypot(front[0, 0] - first[0], front[0, 1] - first[1])
+    dl = hypot(front[-1, 0] - last[0], front[-1, 1] - last[1])
+    if len(front) == 1:
+        return df + dl
+
+    dt = np.hypot(*(front[:-1] - front[1:]).T).tolist()
+    dm = sum(dt) / len(dt)
+    di = sum(abs(d_i - dm) for d_i in dt)
+    return (df + dl + di) / (df + dl + len(dt) * dm)
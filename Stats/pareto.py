@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+from __future__ import division
+import sys
+import numpy as np
+
+sys.dont_write_bytecode = True
+
+
+"""
+Pareto front extraction. Duplicated objective vectors are merged by hashing first, then the first front is found by a
+block dominance filter: rows are sorted by the sum of the objectives, so a row can only be dominated by rows before it,
+and each block of rows is checked at once against the rows kept so far.
+"""
+
+
+def unique_rows(objs):
+    """
+    :param objs: (n x d) array, or list of tuples
+    :return: indices of the first occurrence of each distinct row, inverse (row i equals row unique[inverse[i]])
+    """
+    first = dict()
+    inverse = np.empty(len(objs), dtype=np.int64)
+    unique = []
+    for i, row in enumerate(map(tuple, np.asarray(objs).tolist())):
+        j = first.get(row)
+        if j is None:
+            j = first[row] = len(unique)
+            unique.append(i)
+        inverse[i] = j
+    return np.array(unique, dtype=np.int64), inverse
+
+
+def _nondominated_unique(objs, block=256, chunk=4096):
+    """mask of the rows not dominated by another row. objs must not have duplicated rows. minimization"""
+    n = len(objs)
+    order = np.argsort(objs.sum(axis=1), kind='mergesort')
+    rows = objs[order]
+    mask = np.zeros(n, dtype=bool)
+    kept = rows[:0]
+    tri = np.tri(block, k=-1, dtype=bool)
+    for start in range(0, n, block):
+        B = rows[start:start + block]
+        m = len(B)
+        alive = np.ones(m, dtype=bool)
+        for k in range(0, len(kept), chunk):
+            alive &= ~(kept[None, k:k + chunk, :] <= B[:, None, :]).all(axis=2).any(axis=1)
+        alive &= ~((B[None, :, :] <= B[:, None, :]).all(axis=2) & tri[:m, :m]).any(axis=1)
+        mask[start:start + m] = alive
+        kept = np.concatenate([kept, B[alive]])
+    res = np.zeros(n, dtype=bool)
+    res[order] = mask
+    return res
+
+
+def nondominated_mask(objs):
+    """
+    :param objs: (n x d) objectives, to be minimized
+    :return: bool mask of the rows in the first front. All copies of a duplicated row get the same value.
+    """
+    objs = np.asarray(objs, dtype=np.float64)
+    if len(objs) == 0:
+        return np.zeros(0, dtype=bool)
+    unique, inverse = unique_rows(objs)
+    return _nondominated_unique(objs[unique])[inverse]
+
+
+def first_front(pop, key=None):
+    """
+    the first front of pop (with DEAP fitness, according to the weights), in the order of pop.
+    :param key: individuals with the same key(ind) are kept once. default: one individual per objective vector
+    :return: list of individuals
+    """
+    if len(pop) == 0:
+        return []
+    objs = -np.array([ind.fitness.wvalues for ind in pop], dtype=np.float64)
+    unique, inverse = unique_rows(objs)
+    mask = _nondominated_unique(objs[unique])[inverse]
+
+    if key is None:
+        return [pop[i] for i in unique if mask[i]]
+
+    res = []
+    seen_ids, seen_keys = set(), set()
+    for ind, ok in zip(pop, mask):
+        if not ok or id(ind) in seen_ids:
+            continue
+        seen_ids.add(id(ind))
+        k = key(ind)
+        if k not in seen_keys:
+            seen_keys.add(k)
+            res.append(ind)
+    return res
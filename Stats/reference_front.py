@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+from __future__ import division
+import os
+import sys
+import numpy as np
+from Stats.pareto import nondominated_mask, unique_rows
+from Stats.result_file import load_result_file
+
+sys.dont_write_bytecode = True
+
+
+"""
+Incremental archive of the reference (best known) front of a model, the source of optimal_in_his/<model>.txt.
+Kept next to the txt as
+    <model>.front.npz   the front, objectives float64 matrix
+    <model>.manifest    one "size mtime path" line per result file already merged into the front
+Only the result files not in the manifest (or changed since) are read, and the new valid points are checked against
+the front, so an update costs about the size of the new data. The front is saved before the manifest; if the update
+is interrupted in between, the files are merged again next time, which does not change the front.
+"""
+
+
+def _weakly_dominated(points, by, chunk=1 << 22):
+    """:return: mask of the points which are weakly dominated by (or equal to) some row of by. minimization"""
+    res = np.zeros(len(points), dtype=bool)
+    if len(points) == 0 or len(by) == 0:
+        return res
+    step = max(1, chunk // (len(by) * points.shape[1]))
+    for start in range(0, len(points), step):
+        res[start:start + step] = (by[None, :, :] <= points[start:start + step, None, :]).all(axis=2).any(axis=1)
+    return res
+
+
+def merge_front(front, objs):
+    """
+    :param front: (n x d) pareto front, without duplicates
+    :param objs: (m x d) new objectives
+    :return: the pareto front of both, without duplicates, rows in lexicographic order
+    """
+    objs = np.asarray(objs, dtype=np.float64)
+    if len(objs) == 0:
+        return front
+    if len(front) == 0:
+        front = objs[:0].reshape(0, objs.shape[1])
+    objs = objs[unique_rows(objs)[0]]
+    objs = objs[nondominated_mask(objs)]
+    objs = objs[~_weakly_dominated(objs, front)]
+    front = front[~_weakly_dominated(front, objs)]  # equal rows were removed from objs just above
+    res = np.concatenate([front, objs])
+    return res[np.lexsort(res.T[::-1])]
+
+
+def _stamp(url):
+    st = os.stat(url)
+    return st.st_size, repr(st.st_mtime)
+
+
+class ReferenceArchive(object):
+    def __init__(self, model_name, folder):
+        """
+        :param folder: where the reference fronts are, i.e. PROJECT_PATH/optimal_in_his
+        """
+        self.model_name = model_name
+        self.text_url = os.path.join(folder, model_name + '.txt')
+        self.front_url = os.path.join(folder, model_name + '.front.npz')
+        self.manifest_url = os.path.join(folder, model_name + '.manifest')
+        self.front = None
+        self.manifest = dict()  # result file -> (size, mtime) when merged
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.front_url):
+            with np.load(self.front_url) as data:
+                self.front = data['front']
+        elif os.path.exists(self.text_url):
+            # first update. start from the current reference front, its sources may not be around anymore
+            self.front = merge_front(np.zeros((0, 0)), load_result_file(self.text_url, use_cache=False)[2])
+        else:
+            self.front = np.zeros((0, 0))
+
+        self.manifest = dict()
+        if os.path.exists(self.front_url) and os.path.exists(self.manifest_url):
+            with open(self.manifest_url, 'r') as f:
+                for line in f:
+                    size, mtime, url = line.rstrip('\n').split(' ', 2)
+                    self.manifest[url] = (int(size), mtime)
+
+    def pending(self, files):
+        """:return: the files not merged yet, or changed since"""
+        return [url for url in files if self.manifest.get(url) != _stamp(url)]
+
+    def update(self, files):
+        """
+        merge the valid objectives (first objective, the number of violations, is 0) of the new result files.
+        points of a changed file merged before stay in the front.
+        :return: number of files read
+        """
+        new_files = self.pending(files)
+        new_objs = []
+        for url in new_files:
+            fits = load_result_file(url)[2]
+            if len(fits):
+                new_objs.append(fits[fits[:, 0] == 0])
+        if new_objs:
+            self.front = merge_front(self.front, np.concatenate(new_objs))
+        for url in new_files:
+            self.manifest[url] = _stamp(url)
+        return len(new_files)
+
+    def save(self):
+        tmp = '%s.%d.npz' % (self.front_url, os.getpid())
+        np.savez(tmp, front=self.front)
+        os.rename(tmp, self.front_url)
+
+        tmp = '%s.%d' % (self.manifest_url, os.getpid())
+        with open(tmp, 'w') as f:
+            for url in sorted(self.manifest):
+                size, mtime = self.manifest[url]
+                f.write('%d %s %s\n' % (size, mtime, url))
+        os.rename(tmp, self.manifest_url)
+
+    def write_text(self):
+        """rewrite optimal_in_his/<model>.txt from the front"""
+        with open(self.text_url, 'w') as f:
+            f.write('~~~\n')
+            for row in self.front.tolist():
+                f.write(' '.join(map(str, row)))
+                f.write('\n')
+            f.write('~~~\n1')
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (C) 2016, Jianfeng Chen <jchen37@ncsu.edu>
+# vim: set ts=4 sts=4 sw=4 expandtab smartindent:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#  THE SOFTWARE.
+
+
+from __future__ import division
+import hashlib
+import os
+import sys
+import numpy as np
+
+sys.dont_write_bytecode = True
+
+
+"""
+Reading the result files (j_res/*.txt, optimal_in_his/*.txt). The format is
+    one '0'/'1' decision string per line (may be none)
+    ~~~
+    one row of objectives per line
+    ~~~
+    runtime
+The file is streamed. Decisions are stored as packed bits (np.packbits rows), objectives as a float64 matrix.
+load_result_file keeps them in <file>.cache.npz, together with the sha1 of the file, so each file is parsed once.
+"""
+
+CACHE_VERSION = 1
+
+
+def _sha1(url):
+    h = hashlib.sha1()
+    with open(url, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return np.frombuffer(h.digest(), dtype=np.uint8)
+
+
+def parse_result_file(url, chunk_rows=256):
+    """
+    :param chunk_rows: decision strings converted at a time
+    :return: packed decisions (n x ceil(featureNum/8) uint8), featureNum, objectives (m x d float64), runtime
+    """
+    packed, pending, fits = [], [], []
+    featureNum = 0
+    section = 0
+    runtime = None
+
+    def flush():
+        buf = ''.join(pending).encode('ascii') if not isinstance(pending[0], bytes) else b''.join(pending)
+        bits = (np.frombuffer(buf, dtype=np.uint8) - ord('0')).reshape(len(pending), featureNum)
+        packed.append(np.packbits(bits, axis=1))
+        del pending[:]
+
+    with open(url, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line == '~~~':
+                section += 1
+                continue
+            if not line:
+                continue
+            if section == 0:
+                if not featureNum:
+                    featureNum = len(line)
+                assert len(line) == featureNum, "%s: decision strings of different lengths" % url
+                pending.append(line)
+                if len(pending) >= chunk_rows:
+                    flush()
+            elif section == 1:
+                fits.append(line)
+            else:
+                runtime = float(line)
+    if pending:
+        flush()
+
+    packed = np.concatenate(packed) if packed else np.zeros((0, 0), dtype=np.uint8)
+    if fits:
+        d = len(fits[0].split())
+        fits = np.fromstring(' '.join(fits), dtype=np.float64, sep=' ').reshape(-1, d)
+    else:
+        fits = np.zeros((0, 0), dtype=np.float64)
+    return packed, featureNum, fits, runtime
+
+
+def _read_cache(url, cache):
+    try:
+        with np.load(cache) as data:
+            meta = data['meta']
+            if int(meta[0]) != CACHE_VERSION:
+                return None
+            st = os.stat(url)
+            if (st.st_size, st.st_mtime) != (meta[1], meta[2]):
+                # touched, but may not be modified. compare the content
+                if st.st_size != meta[1] or not np.array_equal(_sha1(url), data['sha1']):
+                    return None
+            runtime = None if np.isnan(meta[4]) else float(meta[4])
+            return data['packed'], int(meta[3]), data['fits'], runtime
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+
+def _write_cache(url, cache, packed, featureNum, fits, runtime):
+    st = os.stat(url)
+    meta = np.array([CACHE_VERSION, st.st_size, st.st_mtime, featureNum, np.nan if runtime is None else runtime])
+    tmp = '%s.%d.npz' % (cache, os.getpid())
+    try:
+        np.savez(tmp, meta=meta, sha1=_sha1(url), packed=packed, fits=fits)
+        os.rename(tmp, cache)
+    except (IOError, OSError):  # e.g. read-only result folder. just go without the cache
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_result_file(url, use_cache=True):
+    """
+    Same as parse_result_file, through the <url>.cache.npz cache
+    """
+    cache = url + '.cache.npz'
+    if use_cache:
+        res = _read_cache(url, cache)
+        if res is not None:
+            return res
+    res = parse_result_file(url)
+    if use_cache:
+        _write_cache(url, cache, *res)
+    return res
+
+
+def unpack_decisions(packed, featureNum):
+    """:return: (n x featureNum) 0/1 uint8 matrix"""
+    return np.unpackbits(packed, axis=1)[:, :featureNum]
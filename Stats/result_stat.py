@@ -12,7 +12,7 @@ from __future__ import division
 import sys
 import random
 import math
-from functools import reduce
+import numpy as np
 
 # sys.dont_write_bytecode = True
 """
@@ -216,34 +216,27 @@ def a12slow(lst1, lst2):
 
 def a12(lst1, lst2):
     "how often is x in lst1 more than y in lst2?"
-
-    def loop(t, t1, t2):
-        while t1.j < t1.n and t2.j < t2.n:
-            h1 = t1.l[t1.j]
-            h2 = t2.l[t2.j]
-            h3 = t2.l[t2.j + 1] if t2.j + 1 < t2.n else None
-            if h1 > h2:
-                t1.j += 1
-                t1.gt += t2.n - t2.j
-            elif h1 == h2:
-                if h3 and h1 > h3:
-                    t1.gt += t2.n - t2.j - 1
-                t1.j += 1
-                t1.eq += 1
-                t2.eq += 1
-            else:
-                t2, t1 = t1, t2
-        return t.gt * 1.0, t.eq * 1.0
-
-    # --------------------------
-    lst1 = sorted(lst1, reverse=True)
-    lst2 = sorted(lst2, reverse=True)
-    n1 = len(lst1)
-    n2 = len(lst2)
-    t1 = o(l=lst1, j=0, eq=0, gt=0, n=n1)
-    t2 = o(l=lst2, j=0, eq=0, gt=0, n=n2)
-    gt, eq = loop(t1, t1, t2)
-    return gt / (n1 * n2) + eq / 2 / (n1 * n2)
+    lst2 = np.sort(np.asarray(lst2, dtype=float))
+    lst1 = np.asarray(lst1, dtype=float)
+    less = np.searchsorted(lst2, lst1, 'left')  # for each x, #y < x
+    upto = np.searchsorted(lst2, lst1, 'right')  # for each x, #y <= x
+    more, same = int(less.sum()), int((upto - less).sum())
+    return (more + 0.5 * same) / (len(lst1) * len(lst2))
+
+
+def a12s(lsts):
+    """a12 of all pairs of lists at once.
+    returns a matrix: [i][j] = a12(lsts[i], lsts[j])"""
+    lsts = [np.sort(np.asarray(l, dtype=float)) for l in lsts]
+    sizes = np.array([len(l) for l in lsts])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    every = np.concatenate(lsts)  # sorted runs search faster
+    res = np.empty((len(lsts), len(lsts)))
+    for j, l in enumerate(lsts):
+        # twice #y < x plus #y == x, for every x of every list
+        twice = np.searchsorted(l, every, 'left') + np.searchsorted(l, every, 'right')
+        res[:, j] = np.add.reduceat(twice, starts) / (2.0 * sizes * len(l))
+    return res
 
 
 def _a12():
@@ -259,6 +252,11 @@ def _a12():
         t1 = msecs(f1)
         t2 = msecs(f2)
         print n, g(f1()), g(f2()), int((t1 / t2))
+    # with ties
+    for n in [10, 100, 1000]:
+        l1 = [any(range(5)) for _ in xrange(n)]
+        l2 = [any(range(5)) for _ in xrange(n)]
+        print n, f1() == f2() == a12s([l1, l2])[0][1]
 
 
 """Output:
@@ -346,46 +344,47 @@ The rest is just details:
 + Efron advises
   to make the mean of the populations the same (see
   the _yhat,zhat_ stuff shown below).
-+ The class _total_ is a just a quick and dirty accumulation class.
++ All the _b_ resamples are drawn at once, as a matrix of random
+  indices into _yhat_ (and one into _zhat_), and _testStatistics_
+  computes the statistic of every row (resample) in one go.
 + For more details see [the Efron text][efron01].
 
 """
 
 
-def bootstrap(y0, z0, conf=0.01, b=1000):
+def testStatistics(ys, zs):
+    """testStatistic of each pair of rows of ys, zs (one sample per row), at once"""
+    ny, nz = ys.shape[1], zs.shape[1]
+    ymu, zmu = ys.mean(axis=1), zs.mean(axis=1)
+    s1 = np.sqrt(((ys - ymu[:, None]) ** 2).sum(axis=1) / (ny - 1))
+    s2 = np.sqrt(((zs - zmu[:, None]) ** 2).sum(axis=1) / (nz - 1))
+    delta = zmu - ymu
+    scaled = s1 + s2 != 0
+    delta[scaled] /= np.sqrt(s1[scaled] / ny + s2[scaled] / nz)
+    return delta
+
+
+def bootstrap(y0, z0, conf=0.01, b=1000, rng=None, chunk=1 << 22):
     """The bootstrap hypothesis test from
        p220 to 223 of Efron's book 'An
-      introduction to the boostrap."""
-
-    class total():
-
-        "quick and dirty data collector"
-
-        def __init__(i, some=[]):
-            i.sum = i.n = i.mu = 0
-            i.all = []
-            for one in some:
-                i.put(one)
-
-        def put(i, x):
-            i.all.append(x)
-            i.sum += x
-            i.n += 1
-            i.mu = float(i.sum) / i.n
-
-        def __add__(i1, i2):
-            return total(i1.all + i2.all)
-
-    y, z = total(y0), total(z0)
-    x = y + z
-    tobs = testStatistic(y, z)
-    yhat = [y1 - y.mu + x.mu for y1 in y.all]
-    zhat = [z1 - z.mu + x.mu for z1 in z.all]
-    bigger = 0.0
-    for i in range(b):
-        if testStatistic(total(sampleWithReplacement(yhat)),
-                         total(sampleWithReplacement(zhat))) > tobs:
-            bigger += 1
+      introduction to the boostrap.'
+      All the b samples are drawn as one index matrix (chunk numbers at a time).
+      rng: numpy RandomState. By default seeded from 'random', so seed() still
+      makes the test repeatable."""
+    if rng is None:
+        rng = np.random.RandomState(random.getrandbits(32))
+    y, z = np.asarray(y0, dtype=float), np.asarray(z0, dtype=float)
+    mu = np.concatenate([y, z]).mean()
+    tobs = testStatistics(y[None, :], z[None, :])[0]
+    yhat = y - y.mean() + mu
+    zhat = z - z.mean() + mu
+    bigger = 0
+    step = max(1, chunk // max(len(y), len(z)))
+    for start in range(0, b, step):
+        m = min(step, b - start)
+        ys = yhat[rng.randint(0, len(y), size=(m, len(y)))]
+        zs = zhat[rng.randint(0, len(z), size=(m, len(z)))]
+        bigger += int((testStatistics(ys, zs) > tobs).sum())
     return bigger / b < conf
 
 
@@ -435,7 +434,9 @@ _bootstraped()
 (1000, 10.1, 10, 10.8, 1, 'same')
 ````
 
-Warning- the above took 8 seconds to generate since we used 1000 bootstraps.
+Warning- the above took 8 seconds to generate since we used 1000 bootstraps
+(with one python loop per bootstrap; drawing them all at once with numpy, as
+bootstrap does now, takes a few milliseconds).
 As to how many bootstraps are enough, that depends on the data. There are
 results saying 200 to 400 are enough but, since I am  suspicious man, I run it for 1000.
 
@@ -481,21 +482,51 @@ For examples on using this code, see _rdivDemo_ (below).
 """
 
 
+class Treatments:
+    """The treatments sorted by median, all their numbers in one array.
+    Treatments lo..hi-1 are the slice all[at[lo]:at[hi]]; their count and
+    mean come from prefix sums, so no Num is built for a group."""
+
+    def __init__(i, data):
+        i.parts = sorted(data)
+        i.medians = [x.median() for x in i.parts]
+        i.all = np.concatenate([np.asarray(x.all, dtype=float) for x in i.parts])
+        i.at = np.cumsum([0] + [len(x.all) for x in i.parts])
+        i.sums = np.concatenate([[0.0], np.cumsum(np.add.reduceat(i.all, i.at[:-1]))])
+
+    def n(i, lo, hi):
+        return int(i.at[hi] - i.at[lo])
+
+    def mu(i, lo, hi):
+        return (i.sums[hi] - i.sums[lo]) / i.n(lo, hi)
+
+    def values(i, lo, hi):
+        return i.all[i.at[lo]:i.at[hi]]
+
+    def median(i, lo, hi):
+        return float(np.median(i.values(lo, hi)))
+
+    def s(i):
+        return float(np.std(i.all, ddof=1))
+
+
 def scottknott(data, cohen=0.3, small=3, useA12=False, epsilon=0.01):
     """Recursively split data, maximizing delta of
     the expected value of the mean before and
     after the splits.
     Reject splits with under 3 items"""
-    all = reduce(lambda x, y: x + y, data)
-    same = lambda l, r: abs(l.median() - r.median()) <= all.s() * cohen
+    parts = Treatments(data)
     if useA12:
-        same = lambda l, r: not different(l.all, r.all)
+        same = lambda lo, cut, hi: not different(parts.values(lo, cut), parts.values(cut, hi))
+    else:
+        sd = parts.s()
+        same = lambda lo, cut, hi: abs(parts.median(lo, cut) - parts.median(cut, hi)) <= sd * cohen
     big = lambda n: n > small
-    return rdiv(data, all, minMu, big, same, epsilon)
+    return rdiv(data, parts, minMu, big, same, epsilon)
 
 
 def rdiv(data,  # a list of class Nums
-         all,  # all the data combined into one num
+         parts,  # the same, as Treatments
          div,  # function: find the best split
          big,  # function: rejects small splits
          same,  # function: rejects similar splits
@@ -505,71 +536,55 @@ def rdiv(data,  # a list of class Nums
     to all the leaf splits found in this way.
     """
 
-    def recurse(parts, all, rank=0):
+    def recurse(lo, hi, rank=0):
         "Split, then recurse on each part."
-        cut, left, right = maybeIgnore(div(parts, all, big, epsilon),
-                                       same, parts)
+        cut = maybeIgnore(div(parts, lo, hi, big, epsilon), same, lo, hi)
         if cut:
             # if cut, rank "right" higher than "left"
-            rank = recurse(parts[:cut], left, rank) + 1
-            rank = recurse(parts[cut:], right, rank)
+            rank = recurse(lo, cut, rank) + 1
+            rank = recurse(cut, hi, rank)
         else:
             # if no cut, then all get same rank
-            for part in parts:
+            for part in parts.parts[lo:hi]:
                 part.rank = rank
         return rank
 
-    recurse(sorted(data), all)
+    recurse(0, len(parts.parts))
     return data
 
 
-def maybeIgnore(xxx_todo_changeme, same, parts):
-    (cut, left, right) = xxx_todo_changeme
-    if cut:
-        if same(sum(parts[:cut], Num('upto')),
-                sum(parts[cut:], Num('above'))):
-            cut = left = right = None
-    return cut, left, right
+def maybeIgnore(cut, same, lo, hi):
+    if cut and same(lo, cut, hi):
+        cut = None
+    return cut
 
 
-def minMu(parts, all, big, epsilon):
-    """Find a cut in the parts that maximizes
+def minMu(parts, lo, hi, big, epsilon):
+    """Find a cut in the parts lo..hi-1 that maximizes
     the expected value of the difference in
     the mean before and after the cut.
     Reject splits that are insignificantly
     different or that generate very small subsets.
     """
-    cut, left, right = None, None, None
-    before, mu = 0, all.mu
-    for i, l, r in leftRight(parts, epsilon):
-        if big(l.n) and big(r.n):
-            n = all.n * 1.0
-            now = l.n / n * (mu - l.mu) ** 2 + r.n / n * (mu - r.mu) ** 2
+    cut = None
+    before, mu, n = 0, parts.mu(lo, hi), parts.n(lo, hi)
+    for i in leftRight(parts, lo, hi, epsilon):
+        ln, rn = parts.n(lo, i), parts.n(i, hi)
+        if big(ln) and big(rn):
+            now = ln / n * (mu - parts.mu(lo, i)) ** 2 + rn / n * (mu - parts.mu(i, hi)) ** 2
             if now > before:
-                before, cut, left, right = now, i, l, r
-    return cut, left, right
-
-
-def leftRight(parts, epsilon=0.01):
-    """Iterator. For all items in 'parts',
-    return everything to the left and everything
-    from here to the end. For reasons of
-    efficiency, take a first pass over the data
-    to pre-compute and cache right-hand-sides
-    """
-    rights = {}
-    n = j = len(parts) - 1
-    while j > 0:
-        rights[j] = parts[j]
-        if j < n:
-            rights[j] += rights[j + 1]
-        j -= 1
-    left = parts[0]
-    for i, one in enumerate(parts):
-        if i > 0:
-            if parts[i]._median - parts[i - 1]._median > epsilon:
-                yield i, left, rights[i]
-            left += one
+                before, cut = now, i
+    return cut
+
+
+def leftRight(parts, lo, hi, epsilon=0.01):
+    """Iterator. All the cuts i in lo+1..hi-1, splitting
+    the parts into lo..i-1 and i..hi-1, where the
+    medians on both sides of the cut differ by more
+    than epsilon."""
+    for i in range(lo + 1, hi):
+        if parts.medians[i] - parts.medians[i - 1] > epsilon:
+            yield i
 
 
 """
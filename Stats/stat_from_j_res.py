@@ -24,13 +24,19 @@
 
 from __future__ import division
 from os import path
-from deap.benchmarks.tools import diversity, convergence
 from deap import creator, base
-from deap.tools.emo import sortNondominated
-from Stats.hv import HyperVolume
+from ProductLine.model_registry import create_once, get_objective_bounds
+from Stats import metrics
+from Stats.hv import WFGHyperVolume
+from Stats.pareto import first_front
+from Stats.result_file import load_result_file, unpack_decisions
 from Stats.result_stat import Stat
+from multiprocessing import Pool
+import itertools
 import sys
 import glob
+import time
+import traceback
 import pdb
 
 sys.dont_write_btyecode = True
@@ -42,12 +48,7 @@ def _get_frontier(pop):
     :param pop:
     :return:
     """
-    front = sortNondominated(pop, len(pop), True)[0]
-    uniques = []
-    for f in front:
-        if f not in uniques:
-            uniques.append(f)
-    return uniques
+    return first_front(pop, key=tuple)
 
 
 def stat_basing_on_pop(pop, record_valid_only, optimal_in_theory=None):
@@ -71,18 +72,19 @@ def stat_basing_on_pop(pop, record_valid_only, optimal_in_theory=None):
         return 0, 1, 1, 0, 0
 
     front = _get_frontier(vpop) if record_valid_only else _get_frontier(pop)
+    # spread sums the distances between consecutive points, so walk the front along objective 1, from first to last
+    front = sorted(front, key=lambda f: (-f.fitness.values[1], f.fitness.values))
 
     front_objs = [f.fitness.values for f in front]
     reference_point = [1] * len(front_objs[0])
-    hv = HyperVolume(reference_point).compute(front_objs)  # did NOT use deap module calc
-    sort_front_by_obj0 = sorted(front, key=lambda f: f.fitness.values[1], reverse=True)
+    hv = WFGHyperVolume(reference_point).compute(front_objs)  # did NOT use deap module calc
 
-    first, last = sort_front_by_obj0[0], sort_front_by_obj0[-1]
-    spread = diversity(front, first, last)
+    first, last = front[0], front[-1]
+    spread = metrics.spread(front_objs, first, last)
     if optimal_in_theory is None:  # not available!!
         IGD = -1
     else:
-        IGD = convergence(front, optimal_in_theory)
+        IGD = metrics.gd(front_objs, optimal_in_theory)
     frontier_size = len(front)
     valid_rate = len(vpop) / len(pop)
 
@@ -90,116 +92,130 @@ def stat_basing_on_pop(pop, record_valid_only, optimal_in_theory=None):
 
 
 def get_stats(model_name, res_file):
-    def get_obj_max():
-        with open(PROJECT_PATH+'/dimacs_data/'+model_name+'.dimacs.augment', 'r') as f:
-            lines = f.readlines()
-            lines = filter(lambda l: not l.startswith('#'), lines)  # filter the comment line. usually the first line
-            lines = map(lambda x: x.rstrip(), lines)  # delete the \n letter
-            lines = map(lambda x:x.split(" "), lines)
-            linesT = map(list, zip(*lines))
-            featureIndex = map(int, linesT[0])
-            cost = map(float, linesT[1])
-            # used_before = map(int, linesT[2])
-            defects = map(int, linesT[3])
-
-        with open(PROJECT_PATH+'/dimacs_data/'+model_name+'.dimacs', 'r') as f:
-            lines = f.readlines()
-            indicator = filter(lambda l: l.startswith("p cnf "), lines)[0]
-            indicator.rstrip()
-            cnfNum = int(indicator.split(" ")[-1])
-
-        objMax = [cnfNum, max(featureIndex), max(featureIndex), sum(defects), sum(cost)]
-        return objMax
-
-    def normalize(fitness, objMax):
-        for o_i, o in enumerate(fitness):
-            fitness[o_i] = o / objMax[o_i]
-
-    with open(res_file, 'r') as f:
-        lines = f.readlines()
-        lines = map(lambda x: x.rstrip(), lines)
-        start = lines.index("~~~")
-        decs = lines[:start]
-        # print(len(set(decs)))
-        fits = lines[start+1:-2]
-        runtime = float(lines[-1])
-        # print("runtime: %f" % runtime)
-        pop_fitness = map(lambda x: x.split(" "), fits)
-        for p_i, p in enumerate(pop_fitness):
-            pop_fitness[p_i] = map(float, p)
-
-    obj_max = get_obj_max()
-
-    creator.create("FitnessMin", base.Fitness, weights=[-1.0] * 5, correct=bool, conVio=list)
-    creator.create("Individual", list, fitness=creator.FitnessMin, fulfill=list)
+    packed, featureNum, fits, runtime = load_result_file(res_file)
+    decs = unpack_decisions(packed, featureNum).tolist()
+    obj_max = get_objective_bounds(model_name)
+    corrects = (fits[:, 0] < 0.01).tolist()
+    pop_fitness = (fits / obj_max).tolist()
+
+    create_once("FitnessMin", base.Fitness, weights=[-1.0] * 5, correct=bool, conVio=list)
+    create_once("Individual", list, fitness=creator.FitnessMin, fulfill=list)
 
     pop = list()
-    for d, p in zip(decs, pop_fitness):
-        ind = creator.Individual(map(int, list(d)))
-        correct = p[0] < 0.01
-        normalize(p, obj_max)
+    for d, p, correct in zip(decs, pop_fitness, corrects):
+        ind = creator.Individual(d)
         ind.fitness = creator.FitnessMin(p)
         ind.fitness.correct = correct
         pop.append(ind)
 
     # fetch the optimal_on_theory
-    with open(PROJECT_PATH+'/optimal_in_his/'+model_name+'.txt', 'r') as f:
-        lines = f.readlines()
-        lines = map(lambda x: x.rstrip(), lines)
-        start = lines.index("~~~")
-        fits = lines[start + 1:-2]
-        opt_pop_fitness = map(lambda x: x.split(" "), fits)
-        for p_i, p in enumerate(opt_pop_fitness):
-            opt_pop_fitness[p_i] = map(float, p)
-    optimal_in_theory = list()
-    for p in opt_pop_fitness:
-        normalize(p, obj_max)
-        optimal_in_theory.append(p)
+    optimal_in_theory = (load_result_file(PROJECT_PATH+'/optimal_in_his/'+model_name+'.txt')[2] / obj_max).tolist()
 
     return stat_basing_on_pop(pop, record_valid_only=True, optimal_in_theory=optimal_in_theory)
 
-import debug
+def _stats_job(job):
+    """
+    :param job: (model_name, res_file)
+    :return: res_file, stats (None if failed), error traceback (None if succeeded), seconds
+    """
+    model_name, res_file = job
+    start = time.time()
+    try:
+        return res_file, get_stats(model_name, res_file), None, time.time() - start
+    except Exception:
+        return res_file, None, traceback.format_exc(), time.time() - start
+
+
+def get_stats_parallel(jobs, processes=None, verbose=True):
+    """
+    run get_stats over the result files on a process pool.
+    a failing file is reported (with its traceback) but does not stop the others.
+    :param jobs: list of (model_name, res_file)
+    :param processes: number of workers. cpu_count() by default. 1 for running in this process
+    :param verbose: report the progress and the time of each file to stderr
+    :return: list of get_stats results, in the order of jobs. None for the failed files
+    """
+    pool = Pool(processes) if processes != 1 else None
+    results = pool.imap(_stats_job, jobs) if pool else itertools.imap(_stats_job, jobs)
+    stats = []
+    start = time.time()
+    try:
+        for i, (res_file, res, error, seconds) in enumerate(results):
+            stats.append(res)
+            if error is not None:
+                sys.stderr.write('[%d/%d] %s FAILED after %.2fs\n%s' % (i+1, len(jobs), res_file, seconds, error))
+            elif verbose:
+                sys.stderr.write('[%d/%d] %s %.2fs\n' % (i+1, len(jobs), res_file, seconds))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    if verbose:
+        failed = sum(1 for res in stats if res is None)
+        sys.stderr.write('%d files in %.2fs, %d failed\n' % (len(jobs), time.time() - start, failed))
+    return stats
+
 
 PROJECT_PATH, _ = [i for i in sys.path if i.endswith('SPL')][0], \
                   sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
-model = ['cellphone', 'webportal', 'eshop', 'eshop(5M)']
-# model = ['eshop']
-all_records = glob.glob('/Users/jianfeng/Desktop/hpc_jres/*.txt')
-algs = ['IBEA', 'SATIBEA', 'NSGA2', 'SPEA2']
-
-for m in model:
-    print(m)
-    if m == 'eshop(5M)':
-        tt = filter(lambda f: 'eshop' in f and '5000k' in f, all_records)
-        m = 'eshop'
-    elif m == 'eshop':
-        tt = filter(lambda f: 'eshop' in f and '5000k' not in f, all_records)
-    else:
-        tt = filter(lambda f: m in f, all_records)
-
-    group_set_hv = []
-    group_set_spread = []
-    group_set_igd = []
-
-    for alg in algs:
-        files = filter(lambda f: '_'+alg+'_' in f, tt)
-        hvs = [alg]
-        spreads = [alg]
-        igds = [alg]
-        for f in files:
-            a, b, c, _, _ = get_stats(m, f)
-            hvs.append(a)
-            spreads.append(b)
-            igds.append(c)
-        group_set_hv.append(hvs)
-        group_set_spread.append(spreads)
-        group_set_igd.append(igds)
-    print('Hypervolume')
-    Stat.rdivDemo(data=group_set_hv, higherTheBetter=True)
-    print('\n\nSpread')
-    Stat.rdivDemo(data=group_set_spread, higherTheBetter=False)
-    print('\n\nIGD')
-    Stat.rdivDemo(data=group_set_igd, higherTheBetter=False)
-
-    print('\n' * 5)
+if __name__ == '__main__':
+    import debug
+
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None  # number of workers
+    model = ['cellphone', 'webportal', 'eshop', 'eshop(5M)']
+    # model = ['eshop']
+    all_records = glob.glob('/Users/jianfeng/Desktop/hpc_jres/*.txt')
+    algs = ['IBEA', 'SATIBEA', 'NSGA2', 'SPEA2']
+
+    # all the files of all the models go to the pool at once
+    groups = []
+    jobs = []
+    for m in model:
+        title = m
+        if m == 'eshop(5M)':
+            tt = filter(lambda f: 'eshop' in f and '5000k' in f, all_records)
+            m = 'eshop'
+        elif m == 'eshop':
+            tt = filter(lambda f: 'eshop' in f and '5000k' not in f, all_records)
+        else:
+            tt = filter(lambda f: m in f, all_records)
+        for alg in algs:
+            files = filter(lambda f: '_'+alg+'_' in f, tt)
+            groups.append((title, alg, len(jobs), len(jobs) + len(files)))
+            jobs.extend((m, f) for f in files)
+
+    stats = get_stats_parallel(jobs, processes)
+
+    for m in model:
+        print(m)
+        group_set_hv = []
+        group_set_spread = []
+        group_set_igd = []
+
+        for title, alg, begin, end in groups:
+            if title != m:
+                continue
+            hvs = [alg]
+            spreads = [alg]
+            igds = [alg]
+            for res in stats[begin:end]:
+                if res is None:  # failed. reported by get_stats_parallel
+                    continue
+                a, b, c, _, _ = res
+                hvs.append(a)
+                spreads.append(b)
+                igds.append(c)
+            if len(hvs) == 1:  # no (successful) file of this algorithm
+                continue
+            group_set_hv.append(hvs)
+            group_set_spread.append(spreads)
+            group_set_igd.append(igds)
+        print('Hypervolume')
+        Stat.rdivDemo(data=group_set_hv, higherTheBetter=True)
+        print('\n\nSpread')
+        Stat.rdivDemo(data=group_set_spread, higherTheBetter=False)
+        print('\n\nIGD')
+        Stat.rdivDemo(data=group_set_igd, higherTheBetter=False)
+
+        print('\n' * 5)